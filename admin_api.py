@@ -0,0 +1,216 @@
+import time
+import random
+import asyncio
+import aiohttp
+from collections import defaultdict
+from typing import Dict, Any, Optional
+from config import Config
+from logger import logger
+from tracing import tracer
+
+class AdminAPIError(Exception):
+    def __init__(self, status: int, description: str):
+        super().__init__(description)
+        self.status = status
+        self.description = description
+
+class CircuitOpenError(AdminAPIError):
+    def __init__(self, retry_after: float):
+        super().__init__(503, "Admin API is unavailable")
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = None, reset_timeout: float = None):
+        self.failure_threshold = failure_threshold or Config.ADMIN_API_FAILURE_THRESHOLD
+        self.reset_timeout = reset_timeout or Config.ADMIN_API_RESET_TIMEOUT
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.times_opened = 0
+        self.rejected = 0
+    
+    def allow(self) -> bool:
+        if self.state == 'open':
+            if self.retry_after() > 0:
+                self.rejected += 1
+                return False
+            self.state = 'half_open'
+            self.trial_in_flight = False
+        if self.state == 'half_open':
+            if self.trial_in_flight:
+                self.rejected += 1
+                return False
+            self.trial_in_flight = True
+        return True
+    
+    def retry_after(self) -> float:
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+    
+    def record_success(self) -> None:
+        if self.state != 'closed':
+            logger.info("Admin API снова доступен, breaker закрыт")
+        self.state = 'closed'
+        self.failures = 0
+        self.trial_in_flight = False
+    
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.state == 'half_open' or self.failures >= self.failure_threshold:
+            if self.state != 'open':
+                self.times_opened += 1
+                logger.warning(f"Admin API недоступен ({self.failures} ошибок подряд), breaker открыт на {self.reset_timeout}с")
+            self.state = 'open'
+            self.opened_at = time.monotonic()
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+            "retry_after": round(self.retry_after(), 1) if self.state == 'open' else 0
+        }
+
+class AdminAPIClient:
+    ENDPOINTS = {
+        'send-message': {'budget': 10, 'idempotent': False},
+        'answer-callback': {'budget': 3, 'idempotent': True},
+        'send-verification-code': {'budget': 15, 'idempotent': False},
+        'create-user': {'budget': 20, 'idempotent': False},
+        'set-verified': {'budget': 5, 'idempotent': True}
+    }
+    DEFAULT_POLICY = {'budget': Config.REQUEST_TIMEOUT, 'idempotent': False}
+    BACKOFF_BASE = 0.1
+    BACKOFF_CAP = 2.0
+    
+    def __init__(self, base_url: str = None, hedge_delay: float = None):
+        self.base_url = (base_url or Config.ADMIN_API_URL or '').rstrip('/')
+        self.hedge_delay = Config.ADMIN_API_HEDGE_DELAY if hedge_delay is None else hedge_delay
+        self.breaker = CircuitBreaker()
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.hedges = 0
+        self.endpoints: Dict[str, Dict[str, Any]] = defaultdict(lambda: {
+            "calls": 0, "failures": 0, "retries": 0, "rejected": 0, "total_latency": 0.0
+        })
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=Config.ADMIN_API_POOL_SIZE)
+            )
+        return self.session
+    
+    async def post(self, endpoint: str, json: Dict[str, Any] = None, params: Dict[str, Any] = None) -> Dict[str, Any]:
+        with tracer.span(f"admin_api.{endpoint}") as span:
+            return await self._post(endpoint, json, params, span)
+    
+    async def _post(self, endpoint: str, json, params, span) -> Dict[str, Any]:
+        policy = self.ENDPOINTS.get(endpoint, self.DEFAULT_POLICY)
+        stats = self.endpoints[endpoint]
+        stats["calls"] += 1
+        if not self.breaker.allow():
+            stats["rejected"] += 1
+            raise CircuitOpenError(self.breaker.retry_after())
+        url = f"{self.base_url}/{endpoint}"
+        hedge = policy['idempotent'] and self.hedge_delay > 0
+        start = time.monotonic()
+        deadline = start + policy['budget']
+        attempt = 0
+        while True:
+            attempt += 1
+            span.set('attempts', attempt)
+            sent = True
+            try:
+                if hedge:
+                    result = await self._hedged(url, json, params, deadline)
+                else:
+                    result = await self._attempt(url, json, params, deadline)
+            except AdminAPIError as e:
+                if e.status < 500:
+                    self.breaker.record_success()
+                    stats["failures"] += 1
+                    raise
+                error = e
+            except asyncio.TimeoutError:
+                error = AdminAPIError(504, f"Admin API {endpoint} timed out")
+            except aiohttp.ClientConnectorError as e:
+                error = AdminAPIError(502, str(e))
+                sent = False
+            except aiohttp.ClientError as e:
+                error = AdminAPIError(502, str(e))
+            except asyncio.CancelledError:
+                self.breaker.trial_in_flight = False
+                raise
+            else:
+                self.breaker.record_success()
+                stats["total_latency"] += time.monotonic() - start
+                return result
+            retryable = policy['idempotent'] or not sent
+            delay = random.uniform(0, min(self.BACKOFF_CAP, self.BACKOFF_BASE * 2 ** attempt))
+            if not retryable or attempt >= Config.ADMIN_API_MAX_ATTEMPTS or time.monotonic() + delay >= deadline:
+                self.breaker.record_failure()
+                stats["failures"] += 1
+                raise error
+            stats["retries"] += 1
+            logger.debug(f"Повтор {endpoint} через {delay:.2f}с: {error.description}")
+            await asyncio.sleep(delay)
+    
+    async def _attempt(self, url: str, json, params, deadline: float) -> Dict[str, Any]:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise asyncio.TimeoutError()
+        async with self._get_session().post(
+            url,
+            json=json,
+            params=params,
+            timeout=aiohttp.ClientTimeout(total=remaining)
+        ) as resp:
+            if resp.status != 200:
+                raise AdminAPIError(resp.status, await resp.text())
+            try:
+                return await resp.json(content_type=None) or {}
+            except ValueError:
+                return {}
+    
+    async def _hedged(self, url: str, json, params, deadline: float) -> Dict[str, Any]:
+        pending = {asyncio.ensure_future(self._attempt(url, json, params, deadline))}
+        error = None
+        try:
+            done, _ = await asyncio.wait(pending, timeout=self.hedge_delay)
+            if not done:
+                self.hedges += 1
+                pending.add(asyncio.ensure_future(self._attempt(url, json, params, deadline)))
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    async def close(self) -> None:
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "breaker": self.breaker.to_dict(),
+            "hedges": self.hedges,
+            "endpoints": {
+                name: {
+                    "calls": data["calls"],
+                    "failures": data["failures"],
+                    "retries": data["retries"],
+                    "rejected": data["rejected"],
+                    "avg_latency_ms": round(
+                        data["total_latency"] / max(1, data["calls"] - data["failures"] - data["rejected"]) * 1000, 2
+                    )
+                }
+                for name, data in self.endpoints.items()
+            }
+        }
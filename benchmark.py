@@ -0,0 +1,329 @@
+import os
+import io
+import sys
+import json
+import time
+import asyncio
+import argparse
+import itertools
+from types import SimpleNamespace
+from typing import Callable, Dict
+
+os.environ.setdefault('PORT', '0')
+os.environ.setdefault('API_ID', '0')
+
+from flask import Request
+from werkzeug.test import EnvironBuilder
+from urllib.parse import parse_qs, urlencode
+from config import Config
+from updates import UpdatesManager
+from callback_monitor import CallbackMonitor
+from router import _extract_params
+from utils import normalize_params
+from keyboards import KeyboardTranslator
+import methods
+import admin_api
+
+BASELINE_FILE = 'benchmark_baseline.json'
+DEFAULT_THRESHOLD = 0.25
+QUEUE_DEPTHS = [10, 100, 1000]
+HISTORY_RATE = 10
+BOT_ID = 1000000001
+
+BENCHMARKS: Dict[str, Callable] = {}
+
+def benchmark(name: str):
+    def decorator(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return decorator
+
+def _filled_manager(depth: int) -> UpdatesManager:
+    manager = UpdatesManager()
+    for i in range(depth):
+        manager.add_update(BOT_ID, {"message": {"message_id": i, "text": "x"}})
+    return manager
+
+def _make_add_update(depth):
+    def setup():
+        manager = _filled_manager(depth)
+        def op():
+            manager.add_update(BOT_ID, {"message": {"message_id": 0, "text": "x"}})
+        return op, {'MAX_QUEUE_SIZE': depth}
+    return setup
+
+def _make_get_updates(depth):
+    def setup():
+        manager = _filled_manager(depth)
+        offset = manager.queues[BOT_ID][0]['update_id']
+        def op():
+            manager.get_updates(BOT_ID, offset, Config.MAX_UPDATES_LIMIT)
+        return op, {'MAX_QUEUE_SIZE': depth}
+    return setup
+
+for _depth in QUEUE_DEPTHS:
+    benchmark(f'updates.add_update[depth={_depth}]')(_make_add_update(_depth))
+    benchmark(f'updates.get_updates[depth={_depth}]')(_make_get_updates(_depth))
+
+def _manager_with_history() -> UpdatesManager:
+    manager = UpdatesManager()
+    now = time.time()
+    count = Config.CLEANUP_INTERVAL * HISTORY_RATE
+    manager.processed_messages[BOT_ID] = {
+        (f"{BOT_ID}_{i}", now - Config.CLEANUP_INTERVAL + i / HISTORY_RATE)
+        for i in range(count)
+    }
+    return manager
+
+@benchmark('updates.is_message_processed[300s]')
+def bench_is_message_processed():
+    manager = _manager_with_history()
+    keys = itertools.cycle([f"{BOT_ID}_{i}" for i in range(0, 3000, 7)] + ['missing'])
+    def op():
+        manager.is_message_processed(BOT_ID, next(keys))
+    return op, {}
+
+@benchmark('updates.mark_message_processed[300s]')
+def bench_mark_message_processed():
+    manager = _manager_with_history()
+    counter = itertools.count()
+    def op():
+        manager.mark_message_processed(BOT_ID, f"new_{next(counter)}")
+    return op, {}
+
+@benchmark('callback_monitor.dedup')
+def bench_callback_dedup():
+    monitor = CallbackMonitor(None)
+    monitor.processed_callbacks[BOT_ID] = {f"{i}_{i}" for i in range(5000)}
+    counter = itertools.count()
+    def op():
+        i = next(counter)
+        monitor._is_new_callback(BOT_ID, f"{i % 10000}_{i % 10000}")
+        monitor._cleanup_old_callbacks(BOT_ID)
+    return op, {}
+
+SAMPLE_PARAMS = {
+    'chat_id': '123456789',
+    'text': 'Привет! ' * 8,
+    'disable_notification': 'false',
+    'reply_markup': json.dumps({'inline_keyboard': [[{'text': 'A', 'callback_data': 'a'}]]})
+}
+
+def _make_extract_params(method, content_type, body, query_string=''):
+    def setup():
+        builder = EnvironBuilder(
+            method=method,
+            path='/botTOKEN/sendMessage',
+            query_string=query_string,
+            content_type=content_type,
+            data=body
+        )
+        environ = builder.get_environ()
+        raw = body.encode('utf-8') if isinstance(body, str) else (body or b'')
+        def op():
+            env = dict(environ)
+            env['wsgi.input'] = io.BytesIO(raw)
+            _extract_params(Request(env))
+        return op, {}
+    return setup
+
+benchmark('router._extract_params[json]')(_make_extract_params(
+    'POST', 'application/json', json.dumps(SAMPLE_PARAMS)
+))
+benchmark('router._extract_params[form]')(_make_extract_params(
+    'POST', 'application/x-www-form-urlencoded', urlencode(SAMPLE_PARAMS)
+))
+benchmark('router._extract_params[query]')(_make_extract_params(
+    'GET', None, None, urlencode(SAMPLE_PARAMS)
+))
+
+@benchmark('utils.normalize_params[query]')
+def bench_normalize_params():
+    parsed = parse_qs(urlencode(SAMPLE_PARAMS))
+    def op():
+        normalize_params(parsed)
+    return op, {}
+
+class _FakeResponse:
+    status = 200
+
+    async def json(self, **kwargs):
+        return {'messageId': 1}
+
+    async def text(self):
+        return ''
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+class _FakeSession:
+    closed = False
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def post(self, *args, **kwargs):
+        return _FakeResponse()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+class _FakeClient:
+    def __init__(self):
+        self.me = SimpleNamespace(id=BOT_ID, bot=True, first_name='Bench', username='bench_bot')
+        self.entity = SimpleNamespace(id=123456789, first_name='User', username='user')
+
+    async def get_me(self):
+        return self.me
+
+    async def get_entity(self, chat_id):
+        return self.entity
+
+def _keyboard(rows: int, cols: int) -> str:
+    return json.dumps({'inline_keyboard': [
+        [
+            {'text': f'{r}:{c}', 'callback_data': f'cb_{r}_{c}'} if c % 2 else
+            {'text': f'{r}:{c}', 'url': f'https://example.com/{r}/{c}'}
+            for c in range(cols)
+        ]
+        for r in range(rows)
+    ]})
+
+def _make_send_message(rows, cols):
+    def setup():
+        api = methods.BotAPIMethods(_FakeClient(), UpdatesManager(), admin_api=admin_api.AdminAPIClient('http://admin'))
+        params = {'chat_id': '123456789', 'text': 'Рассылка', 'reply_markup': _keyboard(rows, cols)}
+        async def op():
+            result = await api.send_message(dict(params))
+            if not result['ok']:
+                raise RuntimeError(result['description'])
+        return op, {'__patch__': (admin_api.aiohttp, 'ClientSession', _FakeSession)}
+    return setup
+
+benchmark('methods.send_message.inline_keyboard[1x1]')(_make_send_message(1, 1))
+benchmark('methods.send_message.inline_keyboard[8x4]')(_make_send_message(8, 4))
+
+@benchmark('keyboards.translate[8x4,cached]')
+def bench_keyboard_cached():
+    translator = KeyboardTranslator()
+    markup = _keyboard(8, 4)
+    def op():
+        translator.translate(markup)
+    return op, {}
+
+@benchmark('keyboards.translate[8x4,uncached]')
+def bench_keyboard_uncached():
+    translator = KeyboardTranslator(max_size=1)
+    markups = itertools.cycle([_keyboard(8, 4), _keyboard(4, 8)])
+    def op():
+        translator.translate(next(markups))
+    return op, {}
+
+def _apply_overrides(overrides: dict) -> list:
+    restore = []
+    for key, value in overrides.items():
+        if key == '__patch__':
+            target, attr, replacement = value
+            restore.append((target, attr, getattr(target, attr)))
+            setattr(target, attr, replacement)
+        else:
+            restore.append((Config, key, getattr(Config, key)))
+            setattr(Config, key, value)
+    return restore
+
+def _calibrate(run_batch: Callable[[int], float], min_time: float) -> int:
+    number = 1
+    while True:
+        if run_batch(number) >= min_time or number >= 10 ** 7:
+            return number
+        number *= 10
+
+def measure(setup: Callable, repeat: int, min_time: float) -> float:
+    op, overrides = setup()
+    restore = _apply_overrides(overrides)
+    loop = None
+    try:
+        if asyncio.iscoroutinefunction(op):
+            loop = asyncio.new_event_loop()
+            async def batch(number):
+                start = time.perf_counter()
+                for _ in range(number):
+                    await op()
+                return time.perf_counter() - start
+            run_batch = lambda number: loop.run_until_complete(batch(number))
+        else:
+            def run_batch(number):
+                start = time.perf_counter()
+                for _ in range(number):
+                    op()
+                return time.perf_counter() - start
+        number = _calibrate(run_batch, min_time)
+        best = min(run_batch(number) for _ in range(repeat))
+        return best / number * 1e9
+    finally:
+        if loop is not None:
+            loop.close()
+        for target, attr, value in reversed(restore):
+            setattr(target, attr, value)
+
+def load_baseline(path: str) -> Dict[str, float]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f).get('results', {})
+
+def save_baseline(path: str, results: Dict[str, float]) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'created_at': int(time.time()),
+            'python': sys.version.split()[0],
+            'results': results
+        }, f, indent=2, ensure_ascii=False, sort_keys=True)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Микро-бенчмарки горячих путей Bot API сервера')
+    parser.add_argument('-k', dest='pattern', default='', help='запускать только бенчмарки, содержащие подстроку')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='файл с базовыми результатами')
+    parser.add_argument('--save', action='store_true', help='сохранить результаты как новый baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='допустимое замедление (0.25 = 25%%)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    baseline = load_baseline(args.baseline)
+    results: Dict[str, float] = {}
+    regressions = []
+    for name, setup in BENCHMARKS.items():
+        if args.pattern and args.pattern not in name:
+            continue
+        ns = measure(setup, args.repeat, args.min_time)
+        results[name] = ns
+        base = baseline.get(name)
+        if base:
+            change = ns / base - 1
+            status = 'РЕГРЕССИЯ' if change > args.threshold else 'ok'
+            print(f"{name:<50} {ns:>12.1f} ns/op  {change:+7.1%}  {status}")
+            if change > args.threshold:
+                regressions.append(name)
+        else:
+            print(f"{name:<50} {ns:>12.1f} ns/op  (нет baseline)")
+
+    if args.save:
+        merged = dict(baseline)
+        merged.update(results)
+        save_baseline(args.baseline, merged)
+        print(f"Baseline сохранён: {args.baseline}")
+        return 0
+    if regressions:
+        print(f"Регрессия больше {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,4 @@
 import asyncio
-import secrets
-import string
 import logging
 from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.client.telegram import TelegramAPIServer
@@ -9,121 +7,116 @@ from aiogram.filters import Command, StateFilter
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.fsm.storage.memory import MemoryStorage
 from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
 from bson import ObjectId
+from pymongo import UpdateOne
+from collections import OrderedDict
 import os
-import aiohttp
 import time
+from admin_api import AdminAPIClient, AdminAPIError
+from bot_listing import BotListing
+from mongo_storage import MongoStorage
+from provisioning import ProvisioningQueue, generate_token, USERNAME_COLLATION
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 load_dotenv()
 BOTFATHER_TOKEN = os.getenv('BOTFATHER_TOKEN')
 MONGODB_URI = os.getenv('MONGODB_URI')
-DOMAIN = os.getenv('DOMAIN')
-PORT = int(os.getenv('PORT'))
-API_ID = int(os.getenv('API_ID'))
-API_HASH = os.getenv('API_HASH')
 ADMIN_API_URL = os.getenv('ADMIN_API_URL')
 BOT_API_BASE = os.getenv('BOT_API_BASE')
+FSM_STATE_TTL = int(os.getenv('FSM_STATE_TTL', 86400))
+FSM_CACHE_TTL = float(os.getenv('FSM_CACHE_TTL', 0))
+PROVISION_CONCURRENCY = int(os.getenv('PROVISION_CONCURRENCY', 4))
+BOT_POOL_SIZE = int(os.getenv('BOT_POOL_SIZE', 0))
 mongo_client = AsyncIOMotorClient(MONGODB_URI)
 db = mongo_client['tg']
 tokens_collection = db['tokens']
 eventflow_users = db['eventflow-userreadmodel']
-session = AiohttpSession(api=TelegramAPIServer.from_base(BOT_API_BASE))
-bot = Bot(token=BOTFATHER_TOKEN, session=session)
-storage = MemoryStorage()
+bot = None
+storage = MongoStorage(db['fsm_states'], state_ttl=FSM_STATE_TTL, cache_ttl=FSM_CACHE_TTL)
 dp = Dispatcher(storage=storage)
 router = Router()
+admin_api = AdminAPIClient(ADMIN_API_URL)
+bot_listing = BotListing(tokens_collection)
+TAKEN_CACHE_TTL = 600
+TAKEN_CACHE_SIZE = 100000
+taken_usernames = OrderedDict()
+background_tasks = []
 
 class BotCreation(StatesGroup):
     waiting_for_name = State()
     waiting_for_username = State()
 
-def generate_token():
-    return ''.join(secrets.choice(string.ascii_letters + string.digits) for _ in range(45))
+def remember_taken(username_lower):
+    taken_usernames[username_lower] = time.monotonic() + TAKEN_CACHE_TTL
+    taken_usernames.move_to_end(username_lower)
+    while len(taken_usernames) > TAKEN_CACHE_SIZE:
+        taken_usernames.popitem(last=False)
+
+def forget_taken(username_lower):
+    taken_usernames.pop(username_lower, None)
+
+def is_known_taken(username_lower):
+    expires_at = taken_usernames.get(username_lower)
+    if expires_at is None:
+        return False
+    if expires_at < time.monotonic():
+        del taken_usernames[username_lower]
+        return False
+    return True
+
+async def ensure_username_indexes():
+    for collection, field in ((eventflow_users, 'UserName'), (eventflow_users, 'Usernames')):
+        try:
+            await collection.create_index(field, collation=USERNAME_COLLATION)
+        except Exception as e:
+            logger.warning(f"Не удалось создать индекс {field}: {e}")
+    try:
+        updates = []
+        async for doc in tokens_collection.find(
+            {'bot_username': {'$exists': True}, 'bot_username_lower': {'$exists': False}},
+            {'bot_username': 1}
+        ):
+            updates.append(UpdateOne({'_id': doc['_id']}, {'$set': {'bot_username_lower': doc['bot_username'].lower()}}))
+            if len(updates) >= 1000:
+                await tokens_collection.bulk_write(updates, ordered=False)
+                updates = []
+        if updates:
+            await tokens_collection.bulk_write(updates, ordered=False)
+    except Exception as e:
+        logger.warning(f"Не удалось заполнить bot_username_lower: {e}")
+    try:
+        await tokens_collection.create_index(
+            'bot_username_lower',
+            unique=True,
+            partialFilterExpression={'bot_username_lower': {'$exists': True}}
+        )
+        logger.info("Индексы для проверки никнеймов готовы")
+    except Exception as e:
+        logger.warning(f"Не удалось создать уникальный индекс bot_username_lower: {e}")
 
 async def check_username_available(username):
     username_lower = username.lower()
-    user = await eventflow_users.find_one({
-        '$or': [
-            {'UserName': {'$regex': f'^{username_lower}$', '$options': 'i'}},
-            {'Usernames': {'$elemMatch': {'$regex': f'^{username_lower}$', '$options': 'i'}}}
-        ]
-    })
+    if is_known_taken(username_lower):
+        logger.info(f"Никнейм {username} уже занят (кэш)")
+        return False
+    user = await eventflow_users.find_one(
+        {'$or': [{'UserName': username_lower}, {'Usernames': username_lower}]},
+        {'_id': 1},
+        collation=USERNAME_COLLATION
+    )
     if user:
         logger.info(f"Никнейм {username} уже занят в eventflow_users")
+        remember_taken(username_lower)
         return False
-    bot_token = await tokens_collection.find_one({'bot_username': {'$regex': f'^{username_lower}$', '$options': 'i'}})
+    bot_token = await tokens_collection.find_one({'bot_username_lower': username_lower}, {'_id': 1})
     if bot_token:
         logger.info(f"Никнейм {username} уже занят в tokens_collection")
+        remember_taken(username_lower)
         return False
     return True
 
-async def create_bot_via_admin(bot_name, username):
-    bot_id = secrets.randbelow(9000000000) + 1000000000
-    access_hash = secrets.randbelow(9223372036854775807)
-    phone = str(bot_id)
-    logger.info(f"Создаём бота: name={bot_name}, username={username}, id={bot_id}")
-    async with aiohttp.ClientSession() as session:
-        params = {
-            'userId': bot_id,
-            'phoneNumber': phone,
-            'code': ''.join(secrets.choice(string.digits) for _ in range(5))
-        }
-        try:
-            logger.info(f"Отправляю код верификации для {bot_id}")
-            async with session.post(
-                f"{ADMIN_API_URL}/send-verification-code",
-                params=params,
-                timeout=aiohttp.ClientTimeout(total=30)
-            ) as resp:
-                if resp.status != 200:
-                    error_text = await resp.text()
-                    logger.error(f"Ошибка отправки кода: {resp.status} - {error_text}")
-                    return None
-                result = await resp.json()
-                phone_code_hash = result.get('phoneCodeHash')
-                if not phone_code_hash:
-                    logger.error("phoneCodeHash не получен")
-                    return None
-                logger.info(f"Код верификации отправлен успешно, hash={phone_code_hash}")
-        except Exception as e:
-            logger.error(f"Исключение при отправке кода: {e}", exc_info=True)
-            return None
-        payload = {
-            "userId": bot_id,
-            "accessHash": access_hash,
-            "phoneNumber": phone,
-            "firstName": bot_name,
-            "lastName": None,
-            "userName": username,
-            "bot": True,
-            "phoneCodeHash": phone_code_hash
-        }
-        try:
-            logger.info(f"Создаю пользователя через API с payload: {payload}")
-            async with session.post(
-                f"{ADMIN_API_URL}/create-user",
-                json=payload,
-                timeout=aiohttp.ClientTimeout(total=30)
-            ) as resp:
-                if resp.status == 200:
-                    logger.info(f"Бот создан успешно: {bot_id}")
-                    return bot_id
-                else:
-                    error_text = await resp.text()
-                    logger.error(f"Ошибка создания бота: {resp.status} - {error_text}")
-                    return None
-        except Exception as e:
-            logger.error(f"Исключение при создании пользователя: {e}", exc_info=True)
-            return None
-
 def get_main_menu_keyboard():
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="➕ Создать бота", callback_data="create_bot")],
@@ -131,11 +124,71 @@ def get_main_menu_keyboard():
         [InlineKeyboardButton(text="ℹ️ Помощь", callback_data="help")]
     ])
 
-def get_mybots_keyboard(user_id):
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🔄 Обновить список", callback_data=f"refresh_bots:{user_id}")],
-        [InlineKeyboardButton(text="« Главное меню", callback_data="main_menu")]
-    ])
+def get_mybots_keyboard(user_id, page=None):
+    rows = []
+    if page and (page['has_prev'] or page['has_next']):
+        nav = []
+        if page['has_prev']:
+            first_id = page['bots'][0]['_id']
+            nav.append(InlineKeyboardButton(
+                text="« Назад",
+                callback_data=f"bots_page:prev:{first_id}:{page['start'] - bot_listing.page_size}"
+            ))
+        if page['has_next']:
+            last_id = page['bots'][-1]['_id']
+            nav.append(InlineKeyboardButton(
+                text="Далее »",
+                callback_data=f"bots_page:next:{last_id}:{page['start'] + len(page['bots'])}"
+            ))
+        rows.append(nav)
+    rows.append([InlineKeyboardButton(text="🔄 Обновить список", callback_data=f"refresh_bots:{user_id}")])
+    rows.append([InlineKeyboardButton(text="« Главное меню", callback_data="main_menu")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+async def provisioning_notify(job, stage, token_doc=None, reason=None):
+    if stage == 'done':
+        remember_taken(job['username'].lower())
+        bot_listing.invalidate(job['owner_id'])
+    elif stage == 'failed' and reason == 'username_taken':
+        remember_taken(job['username'].lower())
+    if not job.get('chat_id') or not job.get('message_id'):
+        return
+    reply_markup = None
+    if stage == 'reserve':
+        text = "⏳ Резервирую идентификатор бота..."
+    elif stage == 'create':
+        text = f"⏳ Регистрирую @{job['username']}..."
+    elif stage == 'done':
+        text = (
+            f"✅ Готово! Поздравляю с новым ботом!\n\n"
+            f"🤖 Бот: {job['bot_name']} @{job['username']}\n"
+            f"ID: `{job['bot_id']}`\n\n"
+            f"Токен для HTTP API:\n`{token_doc['full_token']}`\n\n"
+            f"⚠️ Храни свой токен в безопасности! Он может быть использован для управления твоим ботом.\n\n"
+            f"📖 Документация Bot API: https://core.telegram.org/bots/api"
+        )
+        reply_markup = get_main_menu_keyboard()
+    elif reason == 'username_taken':
+        text = f"❌ Никнейм @{job['username']} уже занят."
+        reply_markup = get_main_menu_keyboard()
+    else:
+        text = "❌ Произошла ошибка при создании бота. Попробуйте позже."
+        reply_markup = get_main_menu_keyboard()
+    await bot.edit_message_text(text, chat_id=job['chat_id'], message_id=job['message_id'], reply_markup=reply_markup)
+
+provisioning = ProvisioningQueue(db, admin_api, provisioning_notify, PROVISION_CONCURRENCY, BOT_POOL_SIZE)
+
+async def render_bot_list(user_id, after=None, before=None, start=1):
+    page = await bot_listing.page(user_id, after=after, before=before, start=start)
+    if not page['bots']:
+        return None, None
+    logger.info(f"Показаны боты {page['start']}-{page['start'] + len(page['bots']) - 1} пользователя {user_id}")
+    response = "🤖 Ваши боты:\n\n"
+    for idx, bot_data in enumerate(page['bots'], page['start']):
+        verified = "✅" if bot_data.get('verified', False) else ""
+        response += f"{idx}. {bot_data.get('bot_name', 'Без имени')} {verified}\n   @{bot_data.get('bot_username', 'unknown')}\n\n"
+    response += "Выберите бота, отправив его номер."
+    return response, get_mybots_keyboard(user_id, page)
 
 def get_bot_actions_keyboard(bot_id):
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -204,21 +257,15 @@ async def cmd_newbot(message: Message, state: FSMContext):
 async def cmd_mybots(message: Message, state: FSMContext):
     logger.info(f"Пользователь {message.from_user.id} выполнил /mybots")
     await state.clear()
-    user_bots = await tokens_collection.find({'owner_id': message.from_user.id}).to_list(length=100)
-    logger.info(f"Найдено {len(user_bots)} ботов для пользователя {message.from_user.id}")
-    if not user_bots:
+    response, keyboard = await render_bot_list(message.from_user.id)
+    if response is None:
         await message.answer(
             "У вас пока нет ботов.\n\n"
             "Используйте /newbot чтобы создать первого бота.",
             reply_markup=get_main_menu_keyboard()
         )
         return
-    response = "🤖 Ваши боты:\n\n"
-    for idx, bot_data in enumerate(user_bots, 1):
-        verified = "✅" if bot_data.get('verified', False) else ""
-        response += f"{idx}. {bot_data.get('bot_name', 'Без имени')} {verified}\n   @{bot_data.get('bot_username', 'unknown')}\n\n"
-    response += "Выберите бота, отправив его номер."
-    await message.answer(response, reply_markup=get_mybots_keyboard(message.from_user.id))
+    await message.answer(response, reply_markup=keyboard)
 
 @router.callback_query(F.data == "main_menu")
 async def show_main_menu(callback: CallbackQuery, state: FSMContext):
@@ -246,9 +293,8 @@ async def callback_create_bot(callback: CallbackQuery, state: FSMContext):
 async def callback_my_bots(callback: CallbackQuery, state: FSMContext):
     logger.info(f"Пользователь {callback.from_user.id} открыл список ботов")
     await state.clear()
-    user_bots = await tokens_collection.find({'owner_id': callback.from_user.id}).to_list(length=100)
-    logger.info(f"Найдено {len(user_bots)} ботов для пользователя {callback.from_user.id}")
-    if not user_bots:
+    response, keyboard = await render_bot_list(callback.from_user.id)
+    if response is None:
         await callback.message.edit_text(
             "У вас пока нет ботов.\n\n"
             "Используйте /newbot чтобы создать бота.",
@@ -256,12 +302,7 @@ async def callback_my_bots(callback: CallbackQuery, state: FSMContext):
         )
         await callback.answer()
         return
-    response = "🤖 Ваши боты:\n\n"
-    for idx, bot_data in enumerate(user_bots, 1):
-        verified = "✅" if bot_data.get('verified', False) else ""
-        response += f"{idx}. {bot_data.get('bot_name', 'Без имени')} {verified}\n   @{bot_data.get('bot_username', 'unknown')}\n\n"
-    response += "Выберите бота, отправив его номер."
-    await callback.message.edit_text(response, reply_markup=get_mybots_keyboard(callback.from_user.id))
+    await callback.message.edit_text(response, reply_markup=keyboard)
     await callback.answer()
 
 @router.callback_query(F.data == "help")
@@ -287,8 +328,9 @@ async def refresh_bots(callback: CallbackQuery):
         logger.warning(f"Пользователь {callback.from_user.id} пытается обновить чужой список")
         await callback.answer("❌ Это не ващ список ботов!", show_alert=True)
         return
-    user_bots = await tokens_collection.find({'owner_id': user_id}).to_list(length=100)
-    if not user_bots:
+    bot_listing.invalidate(user_id)
+    response, keyboard = await render_bot_list(user_id)
+    if response is None:
         await callback.message.edit_text(
             "У вас пока нет ботов.\n\n"
             "Используйте /newbot чтобы создать первого бота.",
@@ -296,19 +338,28 @@ async def refresh_bots(callback: CallbackQuery):
         )
         await callback.answer("✅ Обновлено")
         return
-    response = "🤖 Ваши боты:\n\n"
-    for idx, bot_data in enumerate(user_bots, 1):
-        verified = "✅" if bot_data.get('verified', False) else ""
-        response += f"{idx}. {bot_data.get('bot_name', 'Без имени')} {verified}\n   @{bot_data.get('bot_username', 'unknown')}\n\n"
-    response += "Выберите бота, отправив его номер."
-    await callback.message.edit_text(response, reply_markup=get_mybots_keyboard(user_id))
+    await callback.message.edit_text(response, reply_markup=keyboard)
     await callback.answer("✅ Обновлено")
 
+@router.callback_query(F.data.startswith("bots_page:"))
+async def bots_page(callback: CallbackQuery):
+    _, direction, anchor, start = callback.data.split(":")
+    logger.info(f"Пользователь {callback.from_user.id} листает список ботов ({direction})")
+    if direction == 'prev':
+        response, keyboard = await render_bot_list(callback.from_user.id, before=anchor, start=int(start))
+    else:
+        response, keyboard = await render_bot_list(callback.from_user.id, after=anchor, start=int(start))
+    if response is None:
+        await callback.answer("Список изменился, обновите его.", show_alert=True)
+        return
+    await callback.message.edit_text(response, reply_markup=keyboard)
+    await callback.answer()
+
 @router.callback_query(F.data == "back_to_bots")
 async def back_to_bots(callback: CallbackQuery):
     logger.info(f"Пользователь {callback.from_user.id} возвращается к списку ботов")
-    user_bots = await tokens_collection.find({'owner_id': callback.from_user.id}).to_list(length=100)
-    if not user_bots:
+    response, keyboard = await render_bot_list(callback.from_user.id)
+    if response is None:
         await callback.message.edit_text(
             "У тебя пока нет ботов.\n\n"
             "Используй /newbot чтобы создать бота.",
@@ -316,12 +367,7 @@ async def back_to_bots(callback: CallbackQuery):
         )
         await callback.answer()
         return
-    response = "🤖 Твои боты:\n\n"
-    for idx, bot_data in enumerate(user_bots, 1):
-        verified = "✅" if bot_data.get('verified', False) else ""
-        response += f"{idx}. {bot_data.get('bot_name', 'Без имени')} {verified}\n   @{bot_data.get('bot_username', 'unknown')}\n\n"
-    response += "Выберите бота, отправив его номер."
-    await callback.message.edit_text(response, reply_markup=get_mybots_keyboard(callback.from_user.id))
+    await callback.message.edit_text(response, reply_markup=keyboard)
     await callback.answer()
 
 @router.callback_query(F.data.startswith("bot_info:"))
@@ -360,6 +406,7 @@ async def regenerate_token(callback: CallbackQuery):
         {'_id': ObjectId(bot_id)},
         {'$set': {'token': new_token, 'full_token': new_full_token}}
     )
+    bot_listing.invalidate(callback.from_user.id)
     logger.info(f"Токен регенерирован для бота {bot_id}")
     verified = "✅ Да" if bot_data.get('verified', False) else "❌ Нет"
     await callback.message.edit_text(
@@ -383,37 +430,33 @@ async def verify_bot(callback: CallbackQuery):
         logger.warning(f"Пользователь {callback.from_user.id} пытается верифицировать чужого бота {bot_id}")
         await callback.answer("❌ Бот не найден!", show_alert=True)
         return
-    async with aiohttp.ClientSession() as session:
-        try:
-            logger.info(f"Отправляю запрос на верификацию бота {bot_data['user_id']}")
-            async with session.post(
-                f"{ADMIN_API_URL}/set-verified",
-                params={'userId': bot_data['user_id'], 'verified': True},
-                timeout=aiohttp.ClientTimeout(total=10)
-            ) as resp:
-                if resp.status == 200:
-                    await tokens_collection.update_one(
-                        {'_id': ObjectId(bot_id)},
-                        {'$set': {'verified': True}}
-                    )
-                    logger.info(f"Бот {bot_data['user_id']} успешно верифицирован")
-                    await callback.answer("✅ Бот верифицирован!", show_alert=True)
-                    full_token = bot_data.get('full_token', f"{bot_data['user_id']}:{bot_data['token']}")
-                    await callback.message.edit_text(
-                        f"🤖 Информация о боте\n\n"
-                        f"{bot_data.get('bot_name', 'Без имени')} @{bot_data.get('bot_username', 'unknown')}\n"
-                        f"ID: `{bot_data['user_id']}`\n"
-                        f"Верифицирован: ✅ Да\n\n"
-                        f"Токен: `{full_token}`\n\n",
-                        reply_markup=get_bot_actions_keyboard(bot_id)
-                    )
-                else:
-                    error_text = await resp.text()
-                    logger.error(f"Ошибка верификации бота: {resp.status} - {error_text}")
-                    await callback.answer("❌ Ошибка верификации", show_alert=True)
-        except Exception as e:
-            logger.error(f"Исключение при верификации: {e}", exc_info=True)
-            await callback.answer("❌ Ошибка верификации", show_alert=True)
+    try:
+        logger.info(f"Отправляю запрос на верификацию бота {bot_data['user_id']}")
+        await admin_api.post('set-verified', params={'userId': bot_data['user_id'], 'verified': 'true'})
+    except AdminAPIError as e:
+        logger.error(f"Ошибка верификации бота: {e.status} - {e.description}")
+        await callback.answer("❌ Ошибка верификации", show_alert=True)
+        return
+    except Exception as e:
+        logger.error(f"Исключение при верификации: {e}", exc_info=True)
+        await callback.answer("❌ Ошибка верификации", show_alert=True)
+        return
+    await tokens_collection.update_one(
+        {'_id': ObjectId(bot_id)},
+        {'$set': {'verified': True}}
+    )
+    bot_listing.invalidate(callback.from_user.id)
+    logger.info(f"Бот {bot_data['user_id']} успешно верифицирован")
+    await callback.answer("✅ Бот верифицирован!", show_alert=True)
+    full_token = bot_data.get('full_token', f"{bot_data['user_id']}:{bot_data['token']}")
+    await callback.message.edit_text(
+        f"🤖 Информация о боте\n\n"
+        f"{bot_data.get('bot_name', 'Без имени')} @{bot_data.get('bot_username', 'unknown')}\n"
+        f"ID: `{bot_data['user_id']}`\n"
+        f"Верифицирован: ✅ Да\n\n"
+        f"Токен: `{full_token}`\n\n",
+        reply_markup=get_bot_actions_keyboard(bot_id)
+    )
 
 @router.callback_query(F.data.startswith("delete_bot_confirm:"))
 async def delete_bot_confirm(callback: CallbackQuery):
@@ -441,6 +484,8 @@ async def delete_bot(callback: CallbackQuery):
         await callback.answer("❌ Бот не найден!", show_alert=True)
         return
     await tokens_collection.delete_one({'_id': ObjectId(bot_id)})
+    forget_taken(bot_data.get('bot_username', '').lower())
+    bot_listing.invalidate(callback.from_user.id)
     logger.info(f"Бот {bot_id} (@{bot_data.get('bot_username')}) успешно удалён")
     await callback.message.edit_text(
         f"✅ Бот @{bot_data.get('bot_username', 'unknown')} успешно удалён.\n\n"
@@ -507,40 +552,11 @@ async def process_username(message: Message, state: FSMContext):
         return
     data = await state.get_data()
     bot_name = data['bot_name']
-    logger.info(f"Начинаю создание бота: name={bot_name}, username={username}")
+    logger.info(f"Ставлю в очередь создание бота: name={bot_name}, username={username}")
     status_msg = await message.answer("⏳ Создаю бота...")
-    bot_id = await create_bot_via_admin(bot_name, username)
-    if not bot_id:
-        logger.error(f"Не удалось создать бота для пользователя {message.from_user.id}")
-        await status_msg.edit_text(
-            "❌ Произошла ошибка при создании бота. Попробуйте позже.",
-            reply_markup=get_main_menu_keyboard()
-        )
-        await state.clear()
-        return
-    token = generate_token()
-    full_token = f"{bot_id}:{token}"
-    session_name = f"bot_{message.from_user.id}_{int(time.time())}"
-    await tokens_collection.insert_one({
-        'session_file': f"{session_name}.session",
-        'user_id': bot_id,
-        'token': token,
-        'full_token': full_token,
-        'owner_id': message.from_user.id,
-        'bot_username': username,
-        'bot_name': bot_name,
-        'verified': False,
-        'created_at': time.time()
-    })
-    logger.info(f"Бот успешно создан и сохранён в БД: id={bot_id}, username={username}, owner={message.from_user.id}")
-    await status_msg.edit_text(
-        f"✅ Готово! Поздравляю с новым ботом!\n\n"
-        f"🤖 Бот: {bot_name} @{username}\n"
-        f"ID: `{bot_id}`\n\n"
-        f"Токен для HTTP API:\n`{full_token}`\n\n"
-        f"⚠️ Храни свой токен в безопасности! Он может быть использован для управления твоим ботом.\n\n"
-        f"📖 Документация Bot API: https://core.telegram.org/bots/api",
-        reply_markup=get_main_menu_keyboard()
+    await provisioning.submit(
+        message.from_user.id, bot_name, username,
+        chat_id=message.chat.id, message_id=status_msg.message_id
     )
     await state.clear()
 
@@ -553,11 +569,10 @@ async def select_bot_by_number(message: Message, state: FSMContext):
     try:
         bot_number = int(message.text) - 1
         logger.info(f"Пользователь {message.from_user.id} выбирает бота #{bot_number + 1}")
-        user_bots = await tokens_collection.find({'owner_id': message.from_user.id}).to_list(length=100)
-        if bot_number < 0 or bot_number >= len(user_bots):
-            logger.warning(f"Неверный номер бота: {bot_number + 1}, всего ботов: {len(user_bots)}")
+        bot_data = await bot_listing.resolve(message.from_user.id, bot_number + 1)
+        if bot_data is None:
+            logger.warning(f"Неверный номер бота: {bot_number + 1}")
             return
-        bot_data = user_bots[bot_number]
         full_token = bot_data.get('full_token', f"{bot_data['user_id']}:{bot_data['token']}")
         verified = "✅ Да" if bot_data.get('verified', False) else "❌ Нет"
         response = (
@@ -573,15 +588,42 @@ async def select_bot_by_number(message: Message, state: FSMContext):
     except Exception as e:
         logger.error(f"Ошибка выбора бота: {e}", exc_info=True)
 
-async def main():
+async def setup(bot_instance):
+    global bot
+    bot = bot_instance
+    if router.parent_router is None:
+        dp.include_router(router)
     if not os.path.exists('sessions'):
         os.makedirs('sessions')
         logger.info("Создана директория sessions")
-    dp.include_router(router)
+    background_tasks.append(asyncio.create_task(ensure_username_indexes()))
+    background_tasks.append(asyncio.create_task(bot_listing.ensure_index()))
+    await storage.ensure_indexes()
+    await provisioning.start()
     logger.info("BotFather запущен")
-    logger.info(f"API: {BOT_API_BASE}")
     logger.info(f"Admin API: {ADMIN_API_URL}")
-    await dp.start_polling(bot)
+
+async def shutdown():
+    for task in background_tasks:
+        task.cancel()
+    background_tasks.clear()
+    await provisioning.stop()
+    await admin_api.close()
+    await storage.close()
+
+async def main():
+    session = AiohttpSession(api=TelegramAPIServer.from_base(BOT_API_BASE))
+    polling_bot = Bot(token=BOTFATHER_TOKEN, session=session)
+    await setup(polling_bot)
+    logger.info(f"API: {BOT_API_BASE}")
+    try:
+        await dp.start_polling(polling_bot)
+    finally:
+        await shutdown()
 
 if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
     asyncio.run(main())
\ No newline at end of file
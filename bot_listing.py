@@ -0,0 +1,81 @@
+import time
+from typing import Dict, Any, Optional, Tuple
+from bson import ObjectId
+from logger import logger
+
+class BotListing:
+    PAGE_SIZE = 10
+    CACHE_TTL = 30
+    MAX_OWNERS = 10000
+    PROJECTION = {'bot_name': 1, 'bot_username': 1, 'verified': 1}
+    
+    def __init__(self, collection, page_size: int = PAGE_SIZE, ttl: float = CACHE_TTL):
+        self.collection = collection
+        self.page_size = page_size
+        self.ttl = ttl
+        self.pages: Dict[int, Dict[Tuple, Tuple[float, Dict[str, Any]]]] = {}
+        self.snapshots: Dict[int, Dict[int, ObjectId]] = {}
+    
+    async def ensure_index(self) -> None:
+        try:
+            await self.collection.create_index([('owner_id', 1), ('_id', 1)])
+        except Exception as e:
+            logger.warning(f"Не удалось создать индекс owner_id/_id: {e}")
+    
+    async def page(self, owner_id: int, after: Optional[str] = None, before: Optional[str] = None, start: int = 1) -> Dict[str, Any]:
+        key = (after, before, start)
+        cached = self.pages.get(owner_id, {}).get(key)
+        if cached and cached[0] > time.monotonic():
+            page = cached[1]
+        else:
+            page = await self._fetch(owner_id, after, before, start)
+            now = time.monotonic()
+            owner_pages = {k: v for k, v in self.pages.pop(owner_id, {}).items() if v[0] > now}
+            owner_pages[key] = (now + self.ttl, page)
+            self.pages[owner_id] = owner_pages
+            while len(self.pages) > self.MAX_OWNERS:
+                self.pages.pop(next(iter(self.pages)))
+        self.snapshots.pop(owner_id, None)
+        while len(self.snapshots) >= self.MAX_OWNERS:
+            self.snapshots.pop(next(iter(self.snapshots)))
+        self.snapshots[owner_id] = {
+            page['start'] + i: bot_data['_id'] for i, bot_data in enumerate(page['bots'])
+        }
+        return page
+    
+    async def _fetch(self, owner_id: int, after: Optional[str], before: Optional[str], start: int) -> Dict[str, Any]:
+        query: Dict[str, Any] = {'owner_id': owner_id, 'status': {'$ne': 'pending'}}
+        if before:
+            query['_id'] = {'$lt': ObjectId(before)}
+            direction = -1
+        else:
+            if after:
+                query['_id'] = {'$gt': ObjectId(after)}
+            direction = 1
+        cursor = self.collection.find(query, self.PROJECTION).sort('_id', direction).limit(self.page_size + 1)
+        bots = await cursor.to_list(length=self.page_size + 1)
+        more = len(bots) > self.page_size
+        bots = bots[:self.page_size]
+        if before:
+            bots.reverse()
+            has_prev, has_next = more, True
+        else:
+            has_prev, has_next = after is not None, more
+        return {
+            'bots': bots,
+            'start': max(1, start),
+            'has_prev': has_prev and start > 1,
+            'has_next': has_next and bool(bots)
+        }
+    
+    async def resolve(self, owner_id: int, number: int) -> Optional[Dict[str, Any]]:
+        bot_id = self.snapshots.get(owner_id, {}).get(number)
+        if bot_id is not None:
+            return await self.collection.find_one({'_id': bot_id, 'owner_id': owner_id})
+        if number < 1:
+            return None
+        bots = await self.collection.find({'owner_id': owner_id, 'status': {'$ne': 'pending'}}).sort('_id', 1).skip(number - 1).limit(1).to_list(length=1)
+        return bots[0] if bots else None
+    
+    def invalidate(self, owner_id: int) -> None:
+        self.pages.pop(owner_id, None)
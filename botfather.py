@@ -8,18 +8,36 @@ class BotFatherManager:
     def __init__(self, database, client_manager):
         self.db = database
         self.clients = client_manager
+        self.status = 'pending'
+        self.token: Optional[str] = None
+    
+    async def provision(self) -> None:
+        try:
+            token = await self.ensure_token()
+        except Exception as e:
+            logger.error(f"Ошибка настройки BotFather: {e}", exc_info=True)
+            token = None
+        if token:
+            self.token = token
+            self.status = 'ready'
+        elif self.status != 'disabled':
+            self.status = 'failed'
     
     async def ensure_token(self) -> Optional[str]:
         if not Config.BOTFATHER_PHONE:
             logger.warning("BOTFATHER_PHONE не указан")
+            self.status = 'disabled'
             return None
+        self.status = 'authorizing'
         authorized = await self.clients.authorize_botfather(Config.BOTFATHER_PHONE)
         if not authorized:
             logger.error("Не удалось авторизовать BotFather")
+            self.status = 'failed'
             return None
         botfather_user_id = await self._get_botfather_id()
         if not botfather_user_id:
             logger.error("Не удалось получить ID BotFather")
+            self.status = 'failed'
             return None
         existing_token = await self.db.get_token_data(str(botfather_user_id))
         if existing_token:
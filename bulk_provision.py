@@ -0,0 +1,194 @@
+import os
+import sys
+import json
+import asyncio
+import argparse
+from typing import Dict, Any, List, Tuple, Set, Optional
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import BulkWriteError
+from dotenv import load_dotenv
+from admin_api import AdminAPIClient, AdminAPIError
+from provisioning import ProvisioningQueue, token_document, username_error, taken_usernames
+from logger import logger
+
+INSERT_BATCH = 100
+
+def read_requests(stream) -> List[Tuple[str, str]]:
+    requests = []
+    for line in stream:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('{'):
+            item = json.loads(line)
+            name, username = item.get('name') or item.get('bot_name') or '', item.get('username') or ''
+        else:
+            name, _, username = line.rpartition(',')
+        requests.append((name.strip(), username.strip().lstrip('@')))
+    return requests
+
+class BulkProvisioner:
+    def __init__(self, db, admin_api, owner_id: int, concurrency: int, out=sys.stdout):
+        self.tokens = db['tokens']
+        self.users = db['eventflow-userreadmodel']
+        self.provisioning = ProvisioningQueue(db, admin_api, notify=None, concurrency=concurrency)
+        self.owner_id = owner_id
+        self.semaphore = asyncio.Semaphore(max(1, concurrency))
+        self.out = out
+        self.reserved: Dict[str, Dict[str, Any]] = {}
+        self.identities: Dict[str, Dict[str, Any]] = {}
+        self.in_flight: Set[str] = set()
+        self.done: List[Dict[str, Any]] = []
+        self.released: List[Dict[str, Any]] = []
+        self.created = 0
+        self.failed = 0
+    
+    def emit(self, result: Dict[str, Any]) -> None:
+        if result['ok']:
+            self.created += 1
+        else:
+            self.failed += 1
+        self.out.write(json.dumps(result, ensure_ascii=False) + '\n')
+        self.out.flush()
+    
+    async def run(self, requests: List[Tuple[str, str]]) -> None:
+        seen = set()
+        valid = []
+        for name, username in requests:
+            error = username_error(username)
+            if error is None and not 1 <= len(name) <= 64:
+                error = "name must be 1-64 characters"
+            if error is None and username.lower() in seen:
+                error = "duplicate username in batch"
+            if error:
+                self.emit({"username": username, "ok": False, "error": error})
+                continue
+            seen.add(username.lower())
+            valid.append((name, username))
+        taken = await taken_usernames(self.tokens, self.users, [username for _, username in valid])
+        queue = []
+        for name, username in valid:
+            if username.lower() in taken:
+                self.emit({"username": username, "ok": False, "error": "username is already taken"})
+            else:
+                queue.append((name, username))
+        logger.info(f"Создаю {len(queue)} ботов (отклонено {self.failed})")
+        try:
+            for start in range(0, len(queue), INSERT_BATCH):
+                await self._reserve(queue[start:start + INSERT_BATCH])
+            await asyncio.gather(*(self._provision(key) for key in list(self.reserved)))
+        finally:
+            await self._flush(final=True)
+    
+    async def _reserve(self, batch: List[Tuple[str, str]]) -> None:
+        identities = await asyncio.gather(*(self._reserve_identity(username) for _, username in batch))
+        docs = []
+        for (name, username), identity in zip(batch, identities):
+            if identity is not None:
+                docs.append(dict(token_document(identity['bot_id'], self.owner_id, name, username), status='pending'))
+                self.identities[username.lower()] = identity
+        if not docs:
+            return
+        errors = {}
+        try:
+            await self.tokens.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            errors = {error['index']: error for error in e.details.get('writeErrors', [])}
+        for index, doc in enumerate(docs):
+            if index in errors:
+                duplicate = errors[index].get('code') == 11000
+                self.emit({
+                    "username": doc['bot_username'],
+                    "ok": False,
+                    "error": "username is already taken" if duplicate else errors[index].get('errmsg')
+                })
+            else:
+                self.reserved[doc['bot_username_lower']] = doc
+    
+    async def _reserve_identity(self, username: str) -> Optional[Dict[str, Any]]:
+        async with self.semaphore:
+            try:
+                return await self.provisioning.reserve_identity()
+            except Exception as e:
+                logger.error(f"Не удалось зарезервировать идентификатор для @{username}: {e}", exc_info=True)
+                self.emit({"username": username, "ok": False, "error": str(e)})
+                return None
+    
+    async def _provision(self, key: str) -> None:
+        async with self.semaphore:
+            doc = self.reserved[key]
+            self.in_flight.add(key)
+            try:
+                await self.provisioning.create_user(self.identities.pop(key), doc['bot_name'], doc['bot_username'])
+            except AdminAPIError as e:
+                self._release(key, e.description)
+            except Exception as e:
+                logger.error(f"Ошибка при создании бота @{doc['bot_username']}: {e}", exc_info=True)
+                self._release(key, str(e))
+            else:
+                self.in_flight.discard(key)
+                self.done.append(self.reserved.pop(key))
+        if len(self.done) + len(self.released) >= INSERT_BATCH:
+            await self._flush()
+    
+    def _release(self, key: str, error: str) -> None:
+        self.in_flight.discard(key)
+        doc = self.reserved.pop(key)
+        self.released.append(doc)
+        self.emit({"username": doc['bot_username'], "ok": False, "bot_id": doc['user_id'], "error": error})
+    
+    async def _flush(self, final: bool = False) -> None:
+        done, self.done = self.done, []
+        released, self.released = self.released, []
+        if final:
+            for key in list(self.reserved):
+                if key in self.in_flight:
+                    logger.warning(f"Создание @{self.reserved[key]['bot_username']} прервано, токен оставлен в статусе pending")
+                    continue
+                doc = self.reserved.pop(key)
+                released.append(doc)
+                self.emit({"username": doc['bot_username'], "ok": False, "bot_id": doc['user_id'], "error": "cancelled"})
+        if done:
+            await self.tokens.update_many(
+                {'_id': {'$in': [doc['_id'] for doc in done]}},
+                {'$unset': {'status': ''}}
+            )
+            for doc in done:
+                self.emit({
+                    "username": doc['bot_username'],
+                    "ok": True,
+                    "name": doc['bot_name'],
+                    "bot_id": doc['user_id'],
+                    "token": doc['full_token']
+                })
+        if released:
+            await self.tokens.delete_many({'_id': {'$in': [doc['_id'] for doc in released]}, 'status': 'pending'})
+
+async def provision(args) -> int:
+    client = AsyncIOMotorClient(os.getenv('MONGODB_URI'))
+    admin_api = AdminAPIClient(os.getenv('ADMIN_API_URL'))
+    try:
+        if args.input == '-':
+            requests = read_requests(sys.stdin)
+        else:
+            with open(args.input, 'r', encoding='utf-8') as f:
+                requests = read_requests(f)
+        provisioner = BulkProvisioner(client['tg'], admin_api, args.owner_id, args.concurrency)
+        await provisioner.run(requests)
+        logger.info(f"Готово: создано {provisioner.created}, ошибок {provisioner.failed}")
+        return 0 if provisioner.failed == 0 else 2
+    finally:
+        await admin_api.close()
+        client.close()
+
+def main(argv=None) -> int:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='Пакетное создание ботов; результаты выводятся в stdout в формате JSON lines')
+    parser.add_argument('--owner-id', type=int, required=True, help='Telegram ID владельца ботов')
+    parser.add_argument('--input', default='-', help='файл с JSON lines {"name", "username"} или строками "name,username"')
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args(argv)
+    return asyncio.run(provision(args))
+
+if __name__ == "__main__":
+    sys.exit(main())
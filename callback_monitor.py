@@ -1,16 +1,26 @@
 import asyncio
 import time
-import aiohttp
-from typing import Dict, Set
+from collections import OrderedDict
+from typing import Dict, Any, Set, List, Optional
 from logger import logger
 from config import Config
+from admin_api import AdminAPIClient, AdminAPIError
 
 class CallbackMonitor:
-    def __init__(self, database):
+    PROFILE_PROJECTION = {'UserId': 1, 'FirstName': 1, 'LastName': 1, 'UserName': 1, 'Premium': 1, 'Bot': 1}
+    
+    def __init__(self, database, admin_api=None, message_cache=None):
         self.db = database
+        self.admin_api = admin_api or AdminAPIClient()
+        self.messages = message_cache
         self.bot_monitors: Dict[int, asyncio.Task] = {}
         self.processed_callbacks: Dict[int, Set[str]] = {}
         self.last_check: Dict[int, float] = {}
+        self.profiles: OrderedDict = OrderedDict()
+        self.profile_hits = 0
+        self.profile_misses = 0
+        self.profile_queries = 0
+        self.messages_filled = 0
         
     async def start_monitoring(self, bot_id: int, updates_manager):
         if bot_id in self.bot_monitors:
@@ -20,6 +30,12 @@ class CallbackMonitor:
         self.bot_monitors[bot_id] = task
         logger.info(f"Запущен мониторинг callback для бота {bot_id}")
         
+    async def stop_monitoring(self, bot_id: int):
+        task = self.bot_monitors.pop(bot_id, None)
+        if task:
+            task.cancel()
+            logger.info(f"Остановлен мониторинг callback для бота {bot_id}")
+        
     async def _monitor_bot(self, bot_id: int, updates_manager):
         if bot_id not in self.processed_callbacks:
             self.processed_callbacks[bot_id] = set()
@@ -29,37 +45,29 @@ class CallbackMonitor:
                 callback_answers = await self.db.db['eventflow-botcallbackanswerreadmodel'].find({
                     'PeerId': bot_id
                 }).to_list(length=100)
+                new_answers = []
                 for answer in callback_answers:
                     query_id = str(answer.get('QueryId'))
                     msg_id = answer.get('MsgId')
-                    callback_key = f"{query_id}_{msg_id}"
-                    if callback_key in self.processed_callbacks[bot_id]:
-                        continue
-                    self.processed_callbacks[bot_id].add(callback_key)
+                    if self._is_new_callback(bot_id, f"{query_id}_{msg_id}"):
+                        new_answers.append(answer)
+                if not new_answers:
+                    self._cleanup_old_callbacks(bot_id)
+                    await asyncio.sleep(0.5)
+                    continue
+                profiles = await self._load_profiles([answer.get('UserId', 0) for answer in new_answers])
+                for answer in new_answers:
+                    query_id = str(answer.get('QueryId'))
+                    msg_id = answer.get('MsgId')
                     try:
                         user_id = answer.get('UserId', 0)
                         chat_id = answer.get('ChatId', user_id)
-                        bot_callback = answer.get('BotCallbackAnswer', {})
                         callback_data = answer.get('Data', '')
                         update_data = {
                             "callback_query": {
                                 "id": query_id,
-                                "from": {
-                                    "id": user_id,
-                                    "is_bot": False,
-                                    "first_name": "",
-                                    "username": "",
-                                    "language_code": "ru"
-                                },
-                                "message": {
-                                    "message_id": msg_id,
-                                    "date": int(current_time),
-                                    "chat": {
-                                        "id": chat_id,
-                                        "type": "private"
-                                    },
-                                    "text": ""
-                                },
+                                "from": self._user_dict(user_id, profiles.get(user_id)),
+                                "message": self._message_dict(bot_id, chat_id, msg_id, current_time),
                                 "chat_instance": f"{chat_id}_{int(current_time)}",
                                 "data": callback_data
                             }
@@ -77,6 +85,89 @@ class CallbackMonitor:
                 logger.error(f"Ошибка в мониторинге callback для бота {bot_id}: {e}")
                 await asyncio.sleep(1)
                 
+    async def _load_profiles(self, user_ids: List[int]) -> Dict[int, Optional[Dict[str, Any]]]:
+        now = time.monotonic()
+        profiles = {}
+        missing = []
+        for user_id in set(user_ids):
+            entry = self.profiles.get(user_id)
+            if entry is not None and entry[0] > now:
+                self.profiles.move_to_end(user_id)
+                profiles[user_id] = entry[1]
+                self.profile_hits += 1
+            else:
+                missing.append(user_id)
+                self.profile_misses += 1
+        if not missing or self.db is None:
+            return profiles
+        self.profile_queries += 1
+        try:
+            found = {
+                doc.get('UserId'): doc
+                async for doc in self.db.db['eventflow-userreadmodel'].find({'UserId': {'$in': missing}}, self.PROFILE_PROJECTION)
+            }
+        except Exception as e:
+            logger.warning(f"Не удалось загрузить профили пользователей: {e}")
+            return profiles
+        expires_at = now + Config.USER_PROFILE_CACHE_TTL
+        for user_id in missing:
+            profiles[user_id] = found.get(user_id)
+            self.profiles[user_id] = (expires_at, profiles[user_id])
+            self.profiles.move_to_end(user_id)
+        while len(self.profiles) > Config.USER_PROFILE_CACHE_SIZE:
+            self.profiles.popitem(last=False)
+        return profiles
+    
+    @staticmethod
+    def _user_dict(user_id: int, profile: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        profile = profile or {}
+        user = {
+            "id": user_id,
+            "is_bot": bool(profile.get('Bot', False)),
+            "first_name": profile.get('FirstName') or "",
+            "username": profile.get('UserName') or "",
+            "language_code": "ru"
+        }
+        if profile.get('LastName'):
+            user["last_name"] = profile['LastName']
+        if profile.get('Premium'):
+            user["is_premium"] = True
+        return user
+    
+    def _message_dict(self, bot_id: int, chat_id: int, msg_id: int, current_time: float) -> Dict[str, Any]:
+        cached = self.messages.get(bot_id, chat_id, msg_id) if self.messages is not None else None
+        if cached is None:
+            return {
+                "message_id": msg_id,
+                "date": int(current_time),
+                "chat": {
+                    "id": chat_id,
+                    "type": "private"
+                },
+                "text": ""
+            }
+        self.messages_filled += 1
+        message = {
+            "message_id": msg_id,
+            "date": cached['date'],
+            "chat": cached['chat'],
+            "text": cached.get('text', '')
+        }
+        for field in ('from', 'edit_date', 'reply_markup'):
+            if cached.get(field):
+                message[field] = cached[field]
+        return message
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.profile_hits + self.profile_misses
+        return {
+            "monitored_bots": len(self.bot_monitors),
+            "profiles_cached": len(self.profiles),
+            "profile_hit_rate": round(self.profile_hits / lookups, 4) if lookups else 0.0,
+            "profile_queries": self.profile_queries,
+            "messages_filled": self.messages_filled
+        }
+    
     async def _wait_and_answer(self, query_id: str, bot_id: int, msg_id: int, original_answer):
         for attempt in range(Config.CALLBACK_MAX_ATTEMPTS):
             await asyncio.sleep(Config.CALLBACK_CHECK_INTERVAL)
@@ -93,23 +184,23 @@ class CallbackMonitor:
                         "url": answer_doc.get('url'),
                         "cacheTime": answer_doc.get('cache_time', 0)
                     }
-                    async with aiohttp.ClientSession() as session:
-                        async with session.post(
-                            f"{Config.ADMIN_API_URL}/answer-callback",
-                            json=payload,
-                            timeout=aiohttp.ClientTimeout(total=10)
-                        ) as resp:
-                            if resp.status == 200:
-                                logger.info(f"Ответ отправлен для query_id {query_id}")
-                            else:
-                                error_text = await resp.text()
-                                logger.error(f"Ошибка отправки ответа: {resp.status} - {error_text}")
-                    await self.db.delete_callback_answer(query_id)
+                    try:
+                        await self.admin_api.post('answer-callback', json=payload)
+                        logger.info(f"Ответ отправлен для query_id {query_id}")
+                    except AdminAPIError as e:
+                        logger.error(f"Ошибка отправки ответа: {e.status} - {e.description}")
                     return
             except Exception as e:
                 logger.error(f"Ошибка ожидания ответа callback: {e}")
         logger.debug(f"Таймаут ожидания ответа для callback {query_id}")
         
+    def _is_new_callback(self, bot_id: int, callback_key: str) -> bool:
+        processed = self.processed_callbacks[bot_id]
+        if callback_key in processed:
+            return False
+        processed.add(callback_key)
+        return True
+        
     def _cleanup_old_callbacks(self, bot_id: int):
         if len(self.processed_callbacks[bot_id]) > 10000:
             logger.info(f"Очистка старых callback для бота {bot_id}")
@@ -1,17 +1,24 @@
 import os
+import asyncio
+from datetime import datetime, timezone
 from telethon import TelegramClient
 from telethon.crypto import rsa
 from telethon.network.connection.tcpabridged import ConnectionTcpAbridged
 from telethon.errors import SessionPasswordNeededError
-from telethon.tl.functions.updates import GetStateRequest
-from typing import Optional, Dict
+from telethon.tl import types
+from telethon.tl.functions.updates import GetStateRequest, GetDifferenceRequest
+from typing import Optional, Dict, Callable, Awaitable
 from config import Config
 from logger import logger
+from session_store import StoredSession
 
 class TelegramClientManager:
-    def __init__(self, loop):
+    def __init__(self, loop, update_states, session_store=None):
         self.loop = loop
+        self.states = update_states
+        self.session_store = session_store
         self.cache: Dict[str, TelegramClient] = {}
+        self.resume_tasks: Dict[str, asyncio.Task] = {}
         self._setup_rsa_keys()
     
     def _setup_rsa_keys(self):
@@ -21,9 +28,9 @@ class TelegramClientManager:
             rsa.add_key(key, old=False)
             rsa.add_key(key, old=True)
     
-    def _create_client(self, session_name: str) -> TelegramClient:
+    def _create_client(self, session_name: str, session) -> TelegramClient:
         client = TelegramClient(
-            session=f"{Config.SESSIONS_DIR}/{session_name}",
+            session=session,
             api_id=Config.API_ID,
             api_hash=Config.API_HASH,
             connection=ConnectionTcpAbridged,
@@ -33,7 +40,17 @@ class TelegramClientManager:
         client.session.set_dc(2, Config.DOMAIN, Config.PORT)
         return client
     
-    async def get_client(self, session_name: str) -> TelegramClient:
+    async def _session(self, session_name: str):
+        if self.session_store is None:
+            return f"{Config.SESSIONS_DIR}/{session_name}"
+        return await self.loop.run_in_executor(None, StoredSession, self.session_store, session_name)
+    
+    async def _session_exists(self, session_name: str) -> bool:
+        if self.session_store is None:
+            return os.path.exists(f'{Config.SESSIONS_DIR}/{session_name}.session')
+        return await self.loop.run_in_executor(None, self.session_store.session_exists, session_name)
+    
+    async def get_client(self, session_name: str, on_connect: Callable[[TelegramClient], Awaitable[Callable]] = None) -> TelegramClient:
         if session_name in self.cache:
             client = self.cache[session_name]
             if client.is_connected():
@@ -44,7 +61,7 @@ class TelegramClientManager:
                         return client
                 except:
                     pass
-        client = self._create_client(session_name)
+        client = self._create_client(session_name, await self._session(session_name))
         try:
             await client.connect()
             if not await client.is_user_authorized():
@@ -52,12 +69,27 @@ class TelegramClientManager:
             me = await client.get_me()
             if not me:
                 raise Exception("Failed to get user info")
-            try:
-                await client(GetStateRequest())
-            except Exception as e:
-                logger.warning(f"Не удалось получить state: {e}")
+            saved_state = await self.states.load(session_name)
+            if not saved_state or not saved_state.get('pts'):
+                session_state = client.session.get_update_state(0)
+                if session_state and session_state.pts:
+                    saved_state = {
+                        'pts': session_state.pts,
+                        'qts': session_state.qts,
+                        'date': int(session_state.date.timestamp()),
+                        'seq': session_state.seq
+                    }
+            handler = await on_connect(client) if on_connect else None
+            if handler is not None and saved_state and saved_state.get('pts'):
+                self._start_resume(session_name, client, saved_state, handler)
+            else:
+                try:
+                    await client.catch_up()
+                    state = await client(GetStateRequest())
+                    self._record_state(session_name, state)
+                except Exception as e:
+                    logger.warning(f"Не удалось получить state: {e}")
             self.cache[session_name] = client
-            await client.catch_up()
             logger.info(f"Клиент инициализирован: {session_name} (ID: {me.id})")
             return client
         except Exception as e:
@@ -65,22 +97,80 @@ class TelegramClientManager:
                 await client.disconnect()
             raise Exception(f"Ошибка инициализации клиента: {str(e)}")
     
+    def _record_state(self, session_name: str, state) -> None:
+        self.states.record(
+            session_name,
+            pts=state.pts,
+            qts=state.qts,
+            date=int(state.date.timestamp()),
+            seq=state.seq
+        )
+    
+    def _start_resume(self, session_name: str, client: TelegramClient, state: Dict[str, int], handler: Callable[[types.Message], Awaitable[None]]) -> None:
+        previous = self.resume_tasks.pop(session_name, None)
+        if previous is not None:
+            previous.cancel()
+        task = asyncio.create_task(self._resume(session_name, client, state, handler))
+        self.resume_tasks[session_name] = task
+
+        def forget(finished: asyncio.Task) -> None:
+            if self.resume_tasks.get(session_name) is finished:
+                del self.resume_tasks[session_name]
+        task.add_done_callback(forget)
+    
+    async def _resume(self, session_name: str, client: TelegramClient, state: Dict[str, int], handler) -> None:
+        pts, qts, date = state['pts'], state.get('qts', 0), state.get('date', 0)
+        streamed = 0
+        try:
+            for _ in range(Config.RESUME_MAX_BATCHES):
+                difference = await client(GetDifferenceRequest(
+                    pts=pts,
+                    date=datetime.fromtimestamp(date, tz=timezone.utc),
+                    qts=qts,
+                    pts_total_limit=Config.RESUME_PTS_LIMIT
+                ))
+                if isinstance(difference, types.updates.DifferenceEmpty):
+                    self.states.record(session_name, date=int(difference.date.timestamp()), seq=difference.seq)
+                    break
+                if isinstance(difference, types.updates.DifferenceTooLong):
+                    logger.warning(f"Слишком большой backlog для {session_name}, пропускаю до pts={difference.pts}")
+                    self.states.record(session_name, pts=difference.pts)
+                    break
+                for index, message in enumerate(difference.new_messages, 1):
+                    if isinstance(message, types.Message):
+                        await handler(message)
+                        streamed += 1
+                    if index % Config.RESUME_STREAM_CHUNK == 0:
+                        await asyncio.sleep(0)
+                if isinstance(difference, types.updates.DifferenceSlice):
+                    new_state = difference.intermediate_state
+                else:
+                    new_state = difference.state
+                self._record_state(session_name, new_state)
+                pts, qts, date = new_state.pts, new_state.qts, int(new_state.date.timestamp())
+                if isinstance(difference, types.updates.Difference):
+                    break
+            logger.info(f"Догружено {streamed} пропущенных сообщений для {session_name}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Ошибка догрузки обновлений для {session_name}: {e}")
+    
     async def authorize_botfather(self, phone: str) -> bool:
-        session_path = f'{Config.SESSIONS_DIR}/botfather.session'
-        if os.path.exists(session_path):
+        if await self._session_exists('botfather'):
             logger.info("Сессия BotFather найдена")
             return True
         logger.info("Авторизация BotFather...")
-        client = self._create_client('botfather')
+        client = self._create_client('botfather', await self._session('botfather'))
         try:
             await client.connect()
             await client.send_code_request(phone)
             logger.info(f"Код отправлен на {phone}")
-            code = input("Введите код: ")
+            code = await self.loop.run_in_executor(None, input, "Введите код: ")
             try:
                 await client.sign_in(phone, code)
             except SessionPasswordNeededError:
-                password = input("Введите 2FA пароль: ")
+                password = await self.loop.run_in_executor(None, input, "Введите 2FA пароль: ")
                 await client.sign_in(password=password)
             me = await client.get_me()
             logger.info(f"Авторизован: {me.first_name} (ID: {me.id})")
@@ -93,7 +183,13 @@ class TelegramClientManager:
             return False
     
     async def disconnect_all(self):
+        for task in self.resume_tasks.values():
+            task.cancel()
+        self.resume_tasks.clear()
         for client in self.cache.values():
             if client.is_connected():
                 await client.disconnect()
-        self.cache.clear()
\ No newline at end of file
+        self.cache.clear()
+        await self.states.flush()
+        if self.session_store is not None:
+            await self.loop.run_in_executor(None, self.session_store.close)
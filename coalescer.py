@@ -0,0 +1,131 @@
+import asyncio
+from typing import Dict, Any, Tuple, List, Callable, Awaitable
+from config import Config
+from logger import logger
+
+class EditCoalescer:
+    def __init__(self, window: float = None):
+        self.window = Config.EDIT_COALESCE_WINDOW if window is None else window
+        self.pending: Dict[Tuple, Dict[str, Any]] = {}
+        self.submitted = 0
+        self.executed = 0
+        self.saved = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+    
+    async def submit(self, key: Tuple, params: Dict[str, Any], execute: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        if not self.enabled:
+            return await execute(params)
+        self.submitted += 1
+        future = asyncio.get_running_loop().create_future()
+        entry = self.pending.get(key)
+        if entry is None:
+            entry = {'params': params, 'execute': execute, 'futures': [future]}
+            self.pending[key] = entry
+            entry['task'] = asyncio.create_task(self._flush_later(key))
+        else:
+            entry['params'] = params
+            entry['execute'] = execute
+            entry['futures'].append(future)
+            self.saved += 1
+        return await future
+    
+    async def _flush_later(self, key: Tuple) -> None:
+        await asyncio.sleep(self.window)
+        entry = self.pending.pop(key)
+        self.executed += 1
+        if len(entry['futures']) > 1:
+            logger.debug(f"Объединено {len(entry['futures'])} правок сообщения {key}")
+        try:
+            result = await entry['execute'](entry['params'])
+        except Exception as e:
+            for future in entry['futures']:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future in entry['futures']:
+            if not future.done():
+                future.set_result(result)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "window": self.window,
+            "submitted": self.submitted,
+            "executed": self.executed,
+            "saved": self.saved,
+            "pending": len(self.pending)
+        }
+
+class DeleteBatcher:
+    MAX_BATCH = 100
+    
+    def __init__(self, window: float = None):
+        self.window = Config.DELETE_BATCH_WINDOW if window is None else window
+        self.pending: Dict[Tuple, Dict[str, Any]] = {}
+        self.requested = 0
+        self.upstream_calls = 0
+    
+    async def submit(self, key: Tuple, message_id: int, execute: Callable[[List[int]], Awaitable[None]]) -> bool:
+        self.requested += 1
+        future = asyncio.get_running_loop().create_future()
+        entry = self.pending.get(key)
+        if entry is None:
+            entry = {'execute': execute, 'items': []}
+            self.pending[key] = entry
+            entry['task'] = asyncio.create_task(self._flush_later(key, entry))
+        entry['items'].append((message_id, future))
+        if len(entry['items']) >= self.MAX_BATCH:
+            self.pending.pop(key, None)
+            entry['task'].cancel()
+            asyncio.create_task(self._flush(entry))
+        return await future
+    
+    async def _flush_later(self, key: Tuple, entry: Dict[str, Any]) -> None:
+        await asyncio.sleep(max(0, self.window))
+        if self.pending.get(key) is entry:
+            self.pending.pop(key)
+        await self._flush(entry)
+    
+    async def _flush(self, entry: Dict[str, Any]) -> None:
+        items = entry['items']
+        ids = list(dict.fromkeys(message_id for message_id, _ in items))
+        self.upstream_calls += 1
+        try:
+            await entry['execute'](ids)
+        except Exception as e:
+            if len(ids) == 1:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            logger.warning(f"Пакетное удаление {len(ids)} сообщений не удалось ({e}), удаляю по одному")
+            errors = {}
+            for message_id in ids:
+                self.upstream_calls += 1
+                try:
+                    await entry['execute']([message_id])
+                except Exception as single_error:
+                    errors[message_id] = single_error
+            for message_id, future in items:
+                if future.done():
+                    continue
+                if message_id in errors:
+                    future.set_exception(errors[message_id])
+                else:
+                    future.set_result(True)
+            return
+        for _, future in items:
+            if not future.done():
+                future.set_result(True)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window": self.window,
+            "requested": self.requested,
+            "upstream_calls": self.upstream_calls,
+            "saved": max(0, self.requested - self.upstream_calls),
+            "pending": len(self.pending)
+        }
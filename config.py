@@ -12,16 +12,61 @@ class Config:
     PUBLIC_KEY = os.getenv('PUBLIC_KEY')
     ADMIN_API_URL = os.getenv('ADMIN_API_URL')
     BOTFATHER_PHONE = os.getenv('BOTFATHER_PHONE')
+    BOTFATHER_EMBEDDED = os.getenv('BOTFATHER_EMBEDDED', '').lower() in ('1', 'true', 'yes')
     BRAND = os.getenv('BRAND', 'Bot API Server')
     SESSIONS_DIR = 'sessions'
+    SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'file')
+    SESSION_DB_PATH = os.getenv('SESSION_DB_PATH', 'sessions/sessions.db')
     TEMPLATES_DIR = 'templates'
+    FILES_DIR = os.getenv('FILES_DIR', 'files')
+    MAX_UPLOAD_SIZE = 50 * 1024 * 1024
+    MAX_DOWNLOAD_SIZE = int(os.getenv('MAX_DOWNLOAD_SIZE', 20 * 1024 * 1024))
+    USE_X_SENDFILE = os.getenv('USE_X_SENDFILE', '').lower() in ('1', 'true', 'yes')
     MAX_QUEUE_SIZE = 1000
     MAX_UPDATES_LIMIT = 100
     MAX_TIMEOUT = 50
+    STREAM_WINDOW = int(os.getenv('STREAM_WINDOW', 100))
+    STREAM_HEARTBEAT_INTERVAL = 15
+    OPERATOR_POLL_MAX_BOTS = int(os.getenv('OPERATOR_POLL_MAX_BOTS', 5000))
+    OPERATOR_RESOLVE_TTL = 60
     REQUEST_TIMEOUT = 30
     CALLBACK_MAX_ATTEMPTS = 20
     CALLBACK_CHECK_INTERVAL = 0.3
     CLEANUP_INTERVAL = 300
+    CALLBACK_ANSWER_FLUSH_WINDOW = float(os.getenv('CALLBACK_ANSWER_FLUSH_WINDOW', 0.05))
+    CALLBACK_ANSWER_TTL = 600
+    CALLBACK_ANSWER_CACHE_SIZE = 10000
+    USER_PROFILE_CACHE_SIZE = int(os.getenv('USER_PROFILE_CACHE_SIZE', 50000))
+    USER_PROFILE_CACHE_TTL = 300
+    PREWARM_CLIENTS = int(os.getenv('PREWARM_CLIENTS', 0))
+    PREWARM_CONCURRENCY = int(os.getenv('PREWARM_CONCURRENCY', 10))
+    ACTIVITY_TOUCH_INTERVAL = 60
+    UPDATE_STATE_FLUSH_INTERVAL = 5
+    RESUME_PTS_LIMIT = 5000
+    RESUME_MAX_BATCHES = 10
+    RESUME_STREAM_CHUNK = 50
+    MESSAGE_CACHE_SIZE = int(os.getenv('MESSAGE_CACHE_SIZE', 1000))
+    CHAT_CACHE_SIZE = int(os.getenv('CHAT_CACHE_SIZE', 100000))
+    CHAT_CACHE_TTL = 3600
+    CHAT_NEGATIVE_TTL = 300
+    KEYBOARD_CACHE_SIZE = int(os.getenv('KEYBOARD_CACHE_SIZE', 1024))
+    EDIT_COALESCE_WINDOW = float(os.getenv('EDIT_COALESCE_WINDOW', 0))
+    DELETE_BATCH_WINDOW = float(os.getenv('DELETE_BATCH_WINDOW', 0))
+    SCHEDULER_CONCURRENCY = int(os.getenv('SCHEDULER_CONCURRENCY', 64))
+    ADMIN_API_POOL_SIZE = 100
+    ADMIN_API_MAX_ATTEMPTS = 3
+    ADMIN_API_FAILURE_THRESHOLD = 5
+    ADMIN_API_RESET_TIMEOUT = 15
+    ADMIN_API_HEDGE_DELAY = float(os.getenv('ADMIN_API_HEDGE_DELAY', 0))
+    LOOP_LAG_INTERVAL = 0.1
+    LOOP_LAG_THRESHOLD = float(os.getenv('LOOP_LAG_THRESHOLD', 0.5))
+    PROFILE_INTERVAL = 0.005
+    PROFILE_MAX_SECONDS = 60
+    TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', 0))
+    TRACE_BUFFER_SIZE = 500
+    TRACE_EXPORT_FILE = os.getenv('TRACE_EXPORT_FILE')
+    TRACE_EXPORT_INTERVAL = 1
+    OPERATOR_KEY = os.getenv('OPERATOR_KEY')
     
     @classmethod
     def validate(cls):
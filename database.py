@@ -1,6 +1,13 @@
+import time
+import asyncio
+from collections import OrderedDict
+from datetime import datetime, timedelta
 from motor.motor_asyncio import AsyncIOMotorClient
-from typing import Optional, Dict, Any
+from pymongo import UpdateOne, ReplaceOne
+from typing import Optional, Dict, Any, List
+from config import Config
 from logger import logger
+from tracing import traced
 
 class Database:
     def __init__(self, uri: str, loop):
@@ -10,32 +17,164 @@ class Database:
         self.offsets = self.db['offsets']
         self.auth_sessions = self.db['auth_sessions']
         self.callback_answers = self.db['callback_answers']
+        self.update_states = self.db['update_states']
+        self.answers: OrderedDict = OrderedDict()
+        self.dirty_answers: Dict[str, None] = {}
+        self.answers_flush: Optional[asyncio.Task] = None
     
+    async def ensure_indexes(self) -> None:
+        try:
+            await self.callback_answers.create_index('expire_at', expireAfterSeconds=0)
+        except Exception as e:
+            logger.warning(f"Не удалось создать TTL-индекс callback_answers: {e}")
+        try:
+            result = await self.callback_answers.update_many(
+                {'expire_at': {'$exists': False}},
+                {'$set': {'expire_at': datetime.utcnow() + timedelta(seconds=Config.CALLBACK_ANSWER_TTL)}}
+            )
+            if result.modified_count:
+                logger.info(f"Проставлен expire_at для {result.modified_count} старых ответов на callback")
+        except Exception as e:
+            logger.warning(f"Не удалось заполнить expire_at в callback_answers: {e}")
+        try:
+            await self.callback_answers.create_index('query_id', unique=True)
+        except Exception as e:
+            logger.warning(f"Не удалось создать уникальный индекс query_id: {e}")
+        try:
+            await self.db['eventflow-userreadmodel'].create_index('UserId')
+        except Exception as e:
+            logger.warning(f"Не удалось создать индекс UserId: {e}")
+    
+    @traced('mongo.get_token_data')
     async def get_token_data(self, token: str) -> Optional[Dict[str, Any]]:
         result = await self.tokens.find_one({'token': token})
         if not result:
             result = await self.tokens.find_one({'full_token': token})
         return result
     
+    @traced('mongo.get_tokens_data')
+    async def get_tokens_data(self, tokens: List[str]) -> Dict[str, Dict[str, Any]]:
+        wanted = set(tokens)
+        result = {}
+        async for doc in self.tokens.find({'$or': [{'token': {'$in': tokens}}, {'full_token': {'$in': tokens}}]}):
+            if doc.get('token') in wanted:
+                result[doc['token']] = doc
+            if doc.get('full_token') in wanted:
+                result[doc['full_token']] = doc
+        return result
+    
+    @traced('mongo.create_token')
     async def create_token(self, data: Dict[str, Any]) -> None:
         await self.tokens.insert_one(data)
         logger.info(f"Создан токен для пользователя {data.get('user_id')}")
     
+    @traced('mongo.update_token')
     async def update_token(self, user_id: int, updates: Dict[str, Any]) -> None:
         await self.tokens.update_one(
             {'user_id': user_id},
             {'$set': updates}
         )
     
+    @traced('mongo.touch_token')
+    async def touch_token(self, token_id) -> None:
+        await self.tokens.update_one(
+            {'_id': token_id},
+            {'$set': {'last_active_at': time.time()}}
+        )
+    
+    @traced('mongo.get_recent_tokens')
+    async def get_recent_tokens(self, limit: int) -> List[Dict[str, Any]]:
+        cursor = self.tokens.find(
+            {'last_active_at': {'$exists': True}},
+            {'session_file': 1, 'allowed_updates': 1}
+        ).sort('last_active_at', -1).limit(limit)
+        return await cursor.to_list(length=limit)
+    
+    @traced('mongo.get_update_state')
+    async def get_update_state(self, session_name: str) -> Optional[Dict[str, Any]]:
+        return await self.update_states.find_one({'session': session_name})
+    
+    @traced('mongo.save_update_states')
+    async def save_update_states(self, states: Dict[str, Dict[str, int]]) -> None:
+        if not states:
+            return
+        now = time.time()
+        await self.update_states.bulk_write([
+            UpdateOne({'session': name}, {'$set': {**state, 'updated_at': now}}, upsert=True)
+            for name, state in states.items()
+        ], ordered=False)
+    
+    @traced('mongo.get_callback_answer')
     async def get_callback_answer(self, query_id: str) -> Optional[Dict[str, Any]]:
-        return await self.callback_answers.find_one({'query_id': str(query_id)})
+        query_id = str(query_id)
+        if query_id in self.answers:
+            return self.answers[query_id]
+        return await self.callback_answers.find_one({'query_id': query_id})
     
+    @traced('mongo.save_callback_answer')
     async def save_callback_answer(self, data: Dict[str, Any]) -> None:
-        await self.callback_answers.delete_many({'query_id': data['query_id']})
-        await self.callback_answers.insert_one(data)
+        query_id = str(data['query_id'])
+        data = dict(data, query_id=query_id, expire_at=datetime.utcnow() + timedelta(seconds=Config.CALLBACK_ANSWER_TTL))
+        self.answers[query_id] = data
+        self.answers.move_to_end(query_id)
+        while len(self.answers) > Config.CALLBACK_ANSWER_CACHE_SIZE:
+            oldest = next(iter(self.answers))
+            if oldest in self.dirty_answers:
+                break
+            self.answers.popitem(last=False)
+        self.dirty_answers[query_id] = None
+        if Config.CALLBACK_ANSWER_FLUSH_WINDOW > 0 or not await self.flush_callback_answers():
+            self._schedule_answers_flush()
+    
+    def _schedule_answers_flush(self) -> None:
+        if self.answers_flush is None or self.answers_flush.done():
+            self.answers_flush = asyncio.create_task(self._flush_answers_later())
+    
+    async def _flush_answers_later(self) -> None:
+        delay = Config.CALLBACK_ANSWER_FLUSH_WINDOW
+        while self.dirty_answers:
+            await asyncio.sleep(delay)
+            if await self.flush_callback_answers():
+                delay = Config.CALLBACK_ANSWER_FLUSH_WINDOW
+            else:
+                delay = min(max(delay * 2, 0.1), 5)
+    
+    async def flush_callback_answers(self) -> bool:
+        if not self.dirty_answers:
+            return True
+        batch = [self.answers[query_id] for query_id in self.dirty_answers if query_id in self.answers]
+        self.dirty_answers = {}
+        try:
+            await self.callback_answers.bulk_write([
+                ReplaceOne({'query_id': doc['query_id']}, doc, upsert=True) for doc in batch
+            ], ordered=False)
+        except asyncio.CancelledError:
+            self._restore_dirty(batch)
+            raise
+        except Exception as e:
+            logger.error(f"Не удалось записать {len(batch)} ответов на callback: {e}")
+            self._restore_dirty(batch)
+            return False
+        return True
+    
+    def _restore_dirty(self, batch: List[Dict[str, Any]]) -> None:
+        for doc in batch:
+            if self.answers.get(doc['query_id']) is doc:
+                self.dirty_answers.setdefault(doc['query_id'], None)
     
+    @traced('mongo.delete_callback_answer')
     async def delete_callback_answer(self, query_id: str) -> None:
+        self.answers.pop(str(query_id), None)
+        self.dirty_answers.pop(str(query_id), None)
         await self.callback_answers.delete_one({'query_id': str(query_id)})
     
     async def close(self):
+        if self.answers_flush is not None and not self.answers_flush.done():
+            self.answers_flush.cancel()
+            try:
+                await self.answers_flush
+            except asyncio.CancelledError:
+                pass
+        if not await self.flush_callback_answers():
+            logger.error(f"При остановке не записано {len(self.dirty_answers)} ответов на callback")
         self.client.close()
\ No newline at end of file
@@ -0,0 +1,83 @@
+import asyncio
+from typing import Dict, Any, Optional
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramBadRequest
+from logger import logger
+
+class InProcessSession(BaseSession):
+    def __init__(self, request_processor):
+        super().__init__(json_loads=lambda content: content)
+        self.processor = request_processor
+    
+    async def make_request(self, bot, method, timeout=None):
+        files: Dict[str, Any] = {}
+        params = {}
+        for key, value in method.model_dump(warnings=False).items():
+            value = self.prepare_value(value, bot=bot, files=files, _dumps_json=False)
+            if value is not None:
+                params[key] = value
+        if files:
+            raise TelegramBadRequest(method=method, message="Bad Request: file uploads are not supported in-process")
+        result = await self.processor.process(bot.token, method.__api_method__, params)
+        status_code = 200 if result.get('ok') else result.get('error_code', 500)
+        response = self.check_response(bot=bot, method=method, status_code=status_code, content=result)
+        return response.result
+    
+    def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        raise TelegramBadRequest(method=None, message="Bad Request: file downloads are not supported in-process")
+    
+    async def close(self) -> None:
+        pass
+
+class EmbeddedBotFather:
+    def __init__(self, request_processor, updates_manager):
+        self.processor = request_processor
+        self.updates = updates_manager
+        self.app = None
+        self.bot: Optional[Bot] = None
+        self.bot_id: Optional[int] = None
+        self.tasks = set()
+        self.delivered = 0
+        self.failed = 0
+    
+    async def start(self, token: str) -> None:
+        import bot as botfather_app
+        self.app = botfather_app
+        self.bot = Bot(token=token, session=InProcessSession(self.processor))
+        await self.app.setup(self.bot)
+        me = await self.bot.get_me()
+        self.bot_id = me.id
+        pending = self.updates.subscribe(self.bot_id, self._deliver)
+        for update in pending:
+            self._deliver(update)
+        logger.info(f"BotFather запущен во встроенном режиме (бот {self.bot_id}, в очереди было {len(pending)})")
+    
+    def _deliver(self, update: Dict[str, Any]) -> None:
+        task = asyncio.create_task(self._feed(update))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+    
+    async def _feed(self, update: Dict[str, Any]) -> None:
+        try:
+            await self.app.dp.feed_raw_update(self.bot, update)
+            self.delivered += 1
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Ошибка обработки обновления {update.get('update_id')} BotFather: {e}", exc_info=True)
+    
+    async def stop(self) -> None:
+        if self.bot_id is not None:
+            self.updates.unsubscribe(self.bot_id)
+        for task in list(self.tasks):
+            task.cancel()
+        if self.app is not None:
+            await self.app.shutdown()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "bot_id": self.bot_id,
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "in_flight": len(self.tasks)
+        }
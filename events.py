@@ -1,19 +1,18 @@
 import time
 from telethon import events
+from telethon.tl.types import UpdateNewChannelMessage
 from logger import logger
 
 class EventHandlers:
-    def __init__(self, client, bot_id: int, updates_manager, database):
+    def __init__(self, client, bot_id: int, updates_manager, database, session_name: str = None, update_states=None):
         self.client = client
         self.bot_id = bot_id
         self.updates = updates_manager
         self.db = database
+        self.session_name = session_name
+        self.update_states = update_states
     
     async def setup(self):
-        if self.updates.is_handler_registered(self.bot_id):
-            logger.info(f"Обработчики уже зарегистрированы для бота {self.bot_id}")
-            return
-        
         self.updates.mark_handler_registered(self.bot_id)
         logger.info(f"Регистрация обработчиков для бота {self.bot_id}")
         
@@ -24,7 +23,18 @@ class EventHandlers:
         logger.info(f"Обработчики зарегистрированы для бота {self.bot_id}")
     
     async def _handle_message(self, event):
-        message = event.message
+        pts = getattr(event.original_update, 'pts', None)
+        if self.update_states is not None and pts and not isinstance(event.original_update, UpdateNewChannelMessage):
+            self.update_states.record(
+                self.session_name,
+                pts=pts,
+                date=int(event.message.date.timestamp())
+            )
+        await self.handle_raw_message(event.message)
+    
+    async def handle_raw_message(self, message):
+        if not self.updates.wants(self.bot_id, 'message'):
+            return
         if message.sender_id == self.bot_id or message.out:
             return
         msg_key = f"{message.chat_id}_{message.id}"
@@ -0,0 +1,119 @@
+import json
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple, Union
+from config import Config
+
+class KeyboardError(ValueError):
+    pass
+
+class KeyboardTranslator:
+    BUTTON_FIELDS = {
+        'url': 'url',
+        'callback_data': 'callbackData',
+        'web_app': 'webApp',
+        'login_url': 'loginUrl',
+        'switch_inline_query': 'switchInlineQuery',
+        'switch_inline_query_current_chat': 'switchInlineQueryCurrentChat',
+        'switch_inline_query_chosen_chat': 'switchInlineQueryChosenChat',
+        'copy_text': 'copyText',
+        'callback_game': 'callbackGame',
+        'pay': 'pay'
+    }
+    OBJECT_FIELDS = {
+        'web_app': 'url',
+        'login_url': 'url',
+        'copy_text': 'text'
+    }
+    MAX_BUTTONS = 100
+    MAX_CALLBACK_DATA = 64
+    MAX_KEY_LENGTH = 256
+    
+    def __init__(self, max_size: int = None):
+        self.max_size = max_size or Config.KEYBOARD_CACHE_SIZE
+        self.cache: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def translate(self, reply_markup: Union[str, Dict[str, Any]]) -> Optional[Tuple[List[List[Dict]], Dict[str, Any]]]:
+        if isinstance(reply_markup, str):
+            key = reply_markup
+        else:
+            key = json.dumps(reply_markup, sort_keys=True, ensure_ascii=False)
+        if len(key) > self.MAX_KEY_LENGTH:
+            key = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return self.cache[key]
+        self.misses += 1
+        if isinstance(reply_markup, str):
+            try:
+                reply_markup = json.loads(reply_markup)
+            except ValueError:
+                raise KeyboardError("can't parse reply keyboard markup JSON object")
+        result = self._translate(reply_markup)
+        self.cache[key] = result
+        while len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+        return result
+    
+    def _translate(self, markup: Any) -> Optional[Tuple[List[List[Dict]], Dict[str, Any]]]:
+        if not isinstance(markup, dict):
+            raise KeyboardError("reply markup must be an object")
+        if 'inline_keyboard' not in markup:
+            return None
+        rows = markup['inline_keyboard']
+        if not isinstance(rows, list) or not all(isinstance(row, list) for row in rows):
+            raise KeyboardError("field \"inline_keyboard\" of the InlineKeyboardMarkup must be an Array of Arrays")
+        if sum(len(row) for row in rows) > self.MAX_BUTTONS:
+            raise KeyboardError("too many inline keyboard buttons")
+        buttons = []
+        response_rows = []
+        for row in rows:
+            button_row = []
+            response_row = []
+            for btn in row:
+                button_data, response_btn = self._translate_button(btn)
+                button_row.append(button_data)
+                response_row.append(response_btn)
+            buttons.append(button_row)
+            response_rows.append(response_row)
+        return buttons, {"inline_keyboard": response_rows}
+    
+    def _translate_button(self, btn: Any) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        if not isinstance(btn, dict):
+            raise KeyboardError("InlineKeyboardButton must be an object")
+        text = btn.get('text')
+        if not isinstance(text, str) or not text:
+            raise KeyboardError("field \"text\" of the InlineKeyboardButton must be a non-empty String")
+        actions = [field for field in self.BUTTON_FIELDS if field in btn]
+        if len(actions) != 1:
+            raise KeyboardError("inline keyboard button must have exactly one optional field")
+        field = actions[0]
+        value = btn[field]
+        if field == 'callback_data':
+            if not isinstance(value, str) or not 1 <= len(value.encode('utf-8')) <= self.MAX_CALLBACK_DATA:
+                raise KeyboardError("BUTTON_DATA_INVALID")
+        elif field == 'url':
+            if not isinstance(value, str) or not value:
+                raise KeyboardError("BUTTON_URL_INVALID")
+        elif field in ('switch_inline_query', 'switch_inline_query_current_chat'):
+            if not isinstance(value, str):
+                raise KeyboardError(f"field \"{field}\" must be of type String")
+        elif field in self.OBJECT_FIELDS:
+            if not isinstance(value, dict) or not isinstance(value.get(self.OBJECT_FIELDS[field]), str):
+                raise KeyboardError(f"field \"{field}\" must be an object with \"{self.OBJECT_FIELDS[field]}\"")
+        elif field == 'switch_inline_query_chosen_chat':
+            if not isinstance(value, dict):
+                raise KeyboardError(f"field \"{field}\" must be an object")
+        return {"text": text, self.BUTTON_FIELDS[field]: value}, {"text": text, field: value}
+    
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
@@ -0,0 +1,100 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+import traceback
+from collections import Counter, deque
+from typing import Dict, Any, Optional
+from config import Config
+from logger import logger
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+class LoopWatchdog:
+    def __init__(self, loop, interval: float = None, threshold: float = None):
+        self.loop = loop
+        self.interval = interval or Config.LOOP_LAG_INTERVAL
+        self.threshold = threshold or Config.LOOP_LAG_THRESHOLD
+        self.thread_id: Optional[int] = None
+        self.heartbeat = time.monotonic()
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.recent = deque(maxlen=20)
+        self.profile_lock = threading.Lock()
+        self.stopped = threading.Event()
+    
+    def start(self) -> None:
+        self.thread_id = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self.loop.create_task(self._beat())
+        threading.Thread(target=self._watch, name='loop-watchdog', daemon=True).start()
+        logger.info(f"Watchdog event loop запущен (порог {self.threshold}с)")
+    
+    def stop(self) -> None:
+        self.stopped.set()
+    
+    async def _beat(self) -> None:
+        while not self.stopped.is_set():
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.last_lag = max(0.0, now - expected)
+            self.max_lag = max(self.max_lag, self.last_lag)
+            self.heartbeat = now
+    
+    def _watch(self) -> None:
+        reported = None
+        while not self.stopped.wait(self.interval):
+            heartbeat = self.heartbeat
+            lag = time.monotonic() - heartbeat - self.interval
+            if lag < self.threshold or reported == heartbeat:
+                continue
+            reported = heartbeat
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = ''.join(traceback.format_stack(frame))
+            task = asyncio.current_task(self.loop)
+            self.stalls += 1
+            self.recent.append({
+                "at": int(time.time()),
+                "lag_ms": round(lag * 1000, 1),
+                "task": task.get_name() if task is not None else None,
+                "coroutine": getattr(task.get_coro(), '__qualname__', None) if task is not None else None,
+                "stack": stack
+            })
+            logger.warning(f"Event loop заблокирован на {lag:.2f}с (задача: {task.get_name() if task else '-'}):\n{stack}")
+    
+    def profile(self, seconds: float, interval: float = None) -> Optional[str]:
+        if self.thread_id is None or not self.profile_lock.acquire(blocking=False):
+            return None
+        interval = interval or Config.PROFILE_INTERVAL
+        samples = Counter()
+        try:
+            deadline = time.monotonic() + min(seconds, Config.PROFILE_MAX_SECONDS)
+            while time.monotonic() < deadline:
+                frame = sys._current_frames().get(self.thread_id)
+                if frame is not None:
+                    samples[_collapse(frame)] += 1
+                del frame
+                time.sleep(interval)
+        finally:
+            self.profile_lock.release()
+        return ''.join(f"{stack} {count}\n" for stack, count in samples.most_common())
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "threshold_ms": round(self.threshold * 1000, 1),
+            "current_lag_ms": round(max(self.last_lag, time.monotonic() - self.heartbeat - self.interval, 0.0) * 1000, 1),
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "stalls": self.stalls,
+            "recent": list(self.recent)
+        }
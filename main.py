@@ -1,5 +1,7 @@
 import os
+import sys
 import time
+import signal
 import asyncio
 import threading
 from datetime import datetime
@@ -13,6 +15,12 @@ from botfather import BotFatherManager
 from callback_monitor import CallbackMonitor
 from router import create_app
 from utils import AsyncRunner
+from warmup import ClientWarmup
+from update_state import UpdateStateStore
+from session_store import create_session_store
+from message_cache import MessageCache
+from admin_api import AdminAPIClient
+from loop_watchdog import LoopWatchdog
 
 class BotAPIServer:
     def __init__(self):
@@ -21,10 +29,17 @@ class BotAPIServer:
         self.async_runner = None
         self.db = None
         self.clients = None
+        self.update_states = None
         self.updates = None
+        self.admin_api = None
         self.callback_monitor = None
+        self.messages = None
         self.processor = None
         self.botfather = None
+        self.embedded_botfather = None
+        self.warmup = None
+        self.watchdog = None
+        self.background_tasks = []
         self.app = None
         self.server_start_time = int(time.time())
     
@@ -34,17 +49,56 @@ class BotAPIServer:
         self.main_loop.run_forever()
     
     async def _init_async(self):
+        self.watchdog = LoopWatchdog(self.main_loop)
+        self.watchdog.start()
         self.db = Database(Config.MONGODB_URI, self.main_loop)
-        self.clients = TelegramClientManager(self.main_loop)
+        self.update_states = UpdateStateStore(self.db)
+        self.update_states.start()
+        self.clients = TelegramClientManager(
+            self.main_loop,
+            self.update_states,
+            create_session_store(Config.SESSION_BACKEND)
+        )
         self.updates = UpdatesManager()
-        self.callback_monitor = CallbackMonitor(self.db)
-        self.processor = RequestProcessor(self.db, self.clients, self.updates, self.callback_monitor)
+        self.admin_api = AdminAPIClient(Config.ADMIN_API_URL)
+        self.messages = MessageCache()
+        self.callback_monitor = CallbackMonitor(self.db, self.admin_api, self.messages)
+        self.processor = RequestProcessor(
+            self.db, self.clients, self.updates, self.callback_monitor, self.messages, self.admin_api
+        )
         self.botfather = BotFatherManager(self.db, self.clients)
+        self.warmup = ClientWarmup(self.db, self.processor)
         self.async_runner = AsyncRunner(self.main_loop)
-        await self.botfather.ensure_token()
+        self.background_tasks.append(asyncio.create_task(self.db.ensure_indexes()))
+        self.background_tasks.append(asyncio.create_task(self._start_botfather()))
+        if Config.PREWARM_CLIENTS > 0:
+            self.background_tasks.append(asyncio.create_task(
+                self.warmup.run(Config.PREWARM_CLIENTS, Config.PREWARM_CONCURRENCY)
+            ))
+    
+    async def _start_botfather(self):
+        await self.botfather.provision()
+        if not Config.BOTFATHER_EMBEDDED or not self.botfather.token:
+            return
+        from embedded_botfather import EmbeddedBotFather
+        self.embedded_botfather = EmbeddedBotFather(self.processor, self.updates)
+        try:
+            await self.embedded_botfather.start(self.botfather.token)
+        except Exception as e:
+            logger.error(f"Не удалось запустить встроенный BotFather: {e}", exc_info=True)
+    
+    def status(self) -> dict:
+        return {
+            "ready": self.warmup.state != 'running',
+            "started_at": self.server_start_time,
+            "uptime": int(time.time()) - self.server_start_time,
+            "botfather": self.botfather.status,
+            "botfather_embedded": self.embedded_botfather.stats() if self.embedded_botfather else None,
+            "warmup": self.warmup.status()
+        }
     
     def _create_directories(self):
-        for directory in [Config.SESSIONS_DIR, Config.TEMPLATES_DIR]:
+        for directory in [Config.SESSIONS_DIR, Config.TEMPLATES_DIR, Config.FILES_DIR]:
             if not os.path.exists(directory):
                 os.makedirs(directory)
                 logger.info(f"Создана директория: {directory}")
@@ -62,10 +116,32 @@ class BotAPIServer:
             time.sleep(0.01)
         future = asyncio.run_coroutine_threadsafe(self._init_async(), self.main_loop)
         future.result(timeout=30)
-        self.app = create_app(self.async_runner, self.processor)
+        self.app = create_app(self.async_runner, self.processor, self.status, self.watchdog)
         logger.info(f"{Config.BRAND}")
         logger.info(f"Запущен: {datetime.fromtimestamp(self.server_start_time).strftime('%Y-%m-%d %H:%M:%S')}")
     
+    async def _shutdown_async(self):
+        if self.embedded_botfather is not None:
+            try:
+                await self.embedded_botfather.stop()
+            except Exception as e:
+                logger.error(f"Ошибка остановки встроенного BotFather: {e}", exc_info=True)
+        for task in self.background_tasks:
+            task.cancel()
+        await self.clients.disconnect_all()
+        await self.db.close()
+        await self.admin_api.close()
+    
+    def shutdown(self):
+        if self.main_loop is None or self.db is None:
+            return
+        logger.info("Остановка сервера")
+        future = asyncio.run_coroutine_threadsafe(self._shutdown_async(), self.main_loop)
+        try:
+            future.result(timeout=30)
+        except Exception as e:
+            logger.error(f"Ошибка при остановке: {e}", exc_info=True)
+    
     def run(self):
         self.app.run(
             host='0.0.0.0',
@@ -77,7 +153,11 @@ class BotAPIServer:
 def main():
     server = BotAPIServer()
     server.initialize()
-    server.run()
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.run()
+    finally:
+        server.shutdown()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,144 @@
+import os
+import uuid
+import base64
+import struct
+import asyncio
+import hashlib
+from typing import Dict, Any, Optional, Set, Tuple
+from telethon import utils
+from telethon.tl import types
+from config import Config
+from logger import logger
+
+HASH_CHUNK_SIZE = 1024 * 1024
+PHOTO_FILE_TYPE = 2
+
+def _sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def photo_size_bytes(size) -> int:
+    if isinstance(size, types.PhotoSize):
+        return size.size
+    if isinstance(size, types.PhotoSizeProgressive):
+        return max(size.sizes) if size.sizes else 0
+    if isinstance(size, (types.PhotoCachedSize, types.PhotoStrippedSize)):
+        return len(size.bytes)
+    return 0
+
+def media_size(media) -> int:
+    if isinstance(media, types.Document):
+        return media.size or 0
+    if isinstance(media, types.Photo):
+        sizes = [photo_size_bytes(size) for size in media.sizes]
+        return max(sizes) if sizes else 0
+    return 0
+
+def pack_photo_file_id(photo: types.Photo, size_type: str) -> str:
+    packed = struct.pack('<iiqq', PHOTO_FILE_TYPE, photo.dc_id, photo.id, photo.access_hash)
+    return f"{base64.urlsafe_b64encode(packed).decode().rstrip('=')}.{size_type}"
+
+def resolve_file_id(file_id: str):
+    if '.' not in file_id:
+        return utils.resolve_bot_file_id(file_id)
+    packed, _, size_type = file_id.partition('.')
+    try:
+        data = base64.urlsafe_b64decode(packed + '=' * (-len(packed) % 4))
+        file_type, dc_id, media_id, access_hash = struct.unpack('<iiqq', data)
+    except (ValueError, struct.error):
+        return None
+    if file_type != PHOTO_FILE_TYPE or not 1 <= dc_id <= 5 or not size_type:
+        return None
+    return types.Photo(
+        id=media_id,
+        access_hash=access_hash,
+        file_reference=b'',
+        date=None,
+        sizes=[types.PhotoSize(type=size_type, w=0, h=0, size=0)],
+        dc_id=dc_id
+    )
+
+def photo_to_dict(photo: types.Photo) -> list:
+    result = []
+    for size in photo.sizes:
+        if isinstance(size, (types.PhotoSize, types.PhotoCachedSize, types.PhotoSizeProgressive)):
+            result.append({
+                "file_id": pack_photo_file_id(photo, size.type),
+                "file_unique_id": f"{photo.id}_{size.type}",
+                "width": size.w,
+                "height": size.h,
+                "file_size": photo_size_bytes(size)
+            })
+    return result
+
+def document_to_dict(document: types.Document) -> Dict[str, Any]:
+    file_name = next(
+        (attr.file_name for attr in document.attributes if isinstance(attr, types.DocumentAttributeFilename)),
+        None
+    )
+    result = {
+        "file_id": utils.pack_bot_file_id(document),
+        "file_unique_id": str(document.id),
+        "mime_type": document.mime_type,
+        "file_size": document.size
+    }
+    if file_name:
+        result["file_name"] = file_name
+    return result
+
+class FileCache:
+    def __init__(self, directory: str = None):
+        self.directory = os.path.abspath(directory or Config.FILES_DIR)
+        self.tmp_dir = os.path.join(self.directory, 'tmp')
+        self.index: Dict[Tuple[int, Optional[str]], Dict[str, Any]] = {}
+        self.owners: Dict[str, Set[int]] = {}
+        os.makedirs(self.tmp_dir, exist_ok=True)
+    
+    def resolve(self, file_path: str, bot_id: int = None) -> Optional[str]:
+        if bot_id is not None and bot_id not in self.owners.get(file_path, ()):
+            return None
+        path = os.path.abspath(os.path.join(self.directory, file_path))
+        if not path.startswith(self.directory + os.sep) or path.startswith(self.tmp_dir + os.sep):
+            return None
+        return path if os.path.isfile(path) else None
+    
+    async def fetch(self, client, bot_id: int, file_id: str) -> Dict[str, Any]:
+        media = resolve_file_id(file_id)
+        if media is None:
+            raise ValueError("Bad Request: wrong file_id or the file is temporarily unavailable")
+        key = (media.id, media.sizes[0].type) if isinstance(media, types.Photo) else (media.id, None)
+        cached = self.index.get(key)
+        if cached and self.resolve(cached['file_path']):
+            self.owners.setdefault(cached['file_path'], set()).add(bot_id)
+            return dict(cached, file_id=file_id)
+        size = media_size(media)
+        if size > Config.MAX_DOWNLOAD_SIZE:
+            raise ValueError("Bad Request: file is too big")
+        tmp_path = os.path.join(self.tmp_dir, f"{uuid.uuid4().hex}.part")
+        try:
+            await client.download_media(media, file=tmp_path)
+            loop = asyncio.get_running_loop()
+            digest = await loop.run_in_executor(None, _sha256_file, tmp_path)
+            relative = os.path.join(digest[:2], digest)
+            final_path = os.path.join(self.directory, relative)
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            if os.path.exists(final_path):
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, final_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        entry = {
+            "file_unique_id": f"{key[0]}_{key[1]}" if key[1] else str(media.id),
+            "file_size": os.path.getsize(final_path),
+            "file_path": relative.replace(os.sep, '/')
+        }
+        self.index[key] = entry
+        self.owners.setdefault(entry['file_path'], set()).add(bot_id)
+        logger.info(f"Файл {media.id} сохранён в кэш: {entry['file_path']}")
+        return dict(entry, file_id=file_id)
@@ -0,0 +1,57 @@
+import hashlib
+from collections import OrderedDict, defaultdict
+from typing import Dict, Any, Optional
+from config import Config
+
+class MessageCache:
+    def __init__(self, max_size: int = None):
+        self.max_size = max_size or Config.MESSAGE_CACHE_SIZE
+        self.messages: Dict[int, OrderedDict] = defaultdict(OrderedDict)
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.blake2b((text or '').encode('utf-8'), digest_size=16).hexdigest()
+    
+    def put(self, bot_id: int, chat_id: int, message: Dict[str, Any]) -> None:
+        messages = self.messages[bot_id]
+        key = (chat_id, message['message_id'])
+        messages[key] = {
+            "message_id": message['message_id'],
+            "from": message.get('from'),
+            "chat": message['chat'],
+            "date": message['date'],
+            "edit_date": message.get('edit_date'),
+            "text": message.get('text', ''),
+            "text_hash": self.text_hash(message.get('text', '')),
+            "reply_markup": message.get('reply_markup')
+        }
+        messages.move_to_end(key)
+        while len(messages) > self.max_size:
+            messages.popitem(last=False)
+    
+    def get(self, bot_id: int, chat_id: int, message_id: int) -> Optional[Dict[str, Any]]:
+        messages = self.messages.get(bot_id)
+        key = (chat_id, message_id)
+        if messages is None or key not in messages:
+            self.misses += 1
+            return None
+        messages.move_to_end(key)
+        self.hits += 1
+        return messages[key]
+    
+    def discard(self, bot_id: int, chat_id: int, message_id: int) -> None:
+        messages = self.messages.get(bot_id)
+        if messages is not None:
+            messages.pop((chat_id, message_id), None)
+    
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "bots": len(self.messages),
+            "entries": sum(len(m) for m in self.messages.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
@@ -1,15 +1,24 @@
+import os
 import time
 import json
-import asyncio
-import aiohttp
-from typing import Dict, Any
+from typing import Dict, Any, List
 from config import Config
 from logger import logger
+from keyboards import KeyboardTranslator, KeyboardError
+from media import photo_to_dict, document_to_dict, resolve_file_id
+from admin_api import AdminAPIError, CircuitOpenError
+from resolver import ChatResolver
 
 class BotAPIMethods:
-    def __init__(self, client, updates_manager):
+    def __init__(self, client, updates_manager, bot_id: int = None, message_cache=None, keyboards=None, files=None, admin_api=None, chats=None):
         self.client = client
         self.updates = updates_manager
+        self.bot_id = bot_id
+        self.messages = message_cache
+        self.keyboards = keyboards or KeyboardTranslator()
+        self.files = files
+        self.admin_api = admin_api
+        self.chats = chats or ChatResolver()
     
     async def get_me(self) -> Dict[str, Any]:
         try:
@@ -47,48 +56,31 @@ class BotAPIMethods:
             me = await self.client.get_me()
             if chat_id == me.id:
                 return {"ok": False, "error_code": 400, "description": "Bot can't send messages to itself"}
-            entity = await self.client.get_entity(chat_id)
+            chat = await self.chats.resolve(self.client, self.bot_id, chat_id)
             payload = {
                 "fromUserId": me.id,
-                "toUserId": chat_id,
+                "toUserId": chat_id if isinstance(chat_id, int) else chat['id'],
                 "message": text,
                 "silent": params.get('disable_notification', False)
             }
-            buttons_for_response = None
+            response_markup = None
             if reply_markup:
-                if isinstance(reply_markup, str):
-                    reply_markup = json.loads(reply_markup)
-                if 'inline_keyboard' in reply_markup:
-                    buttons = []
-                    buttons_for_response = []
-                    for row in reply_markup['inline_keyboard']:
-                        button_row = []
-                        response_row = []
-                        for btn in row:
-                            button_data = {"text": btn['text']}
-                            response_btn = {"text": btn['text']}
-                            if 'url' in btn:
-                                button_data['url'] = btn['url']
-                                response_btn['url'] = btn['url']
-                            elif 'callback_data' in btn:
-                                button_data['callbackData'] = btn['callback_data']
-                                response_btn['callback_data'] = btn['callback_data']
-                            button_row.append(button_data)
-                            response_row.append(response_btn)
-                        buttons.append(button_row)
-                        buttons_for_response.append(response_row)
-                    payload['buttons'] = buttons
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{Config.ADMIN_API_URL}/send-message",
-                    json=payload,
-                    timeout=aiohttp.ClientTimeout(total=Config.REQUEST_TIMEOUT)
-                ) as resp:
-                    if resp.status != 200:
-                        error_text = await resp.text()
-                        return {"ok": False, "error_code": 400, "description": error_text}
-                    result_data = await resp.json()
-                    real_message_id = result_data.get('messageId', int(time.time()))
+                keyboard = self.keyboards.translate(reply_markup)
+                if keyboard:
+                    payload['buttons'], response_markup = keyboard
+            try:
+                result_data = await self.admin_api.post('send-message', json=payload)
+            except CircuitOpenError as e:
+                retry_after = max(1, int(e.retry_after))
+                return {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {retry_after}",
+                    "parameters": {"retry_after": retry_after}
+                }
+            except AdminAPIError as e:
+                return {"ok": False, "error_code": 400, "description": e.description}
+            real_message_id = result_data.get('messageId', int(time.time()))
             result = {
                 "ok": True,
                 "result": {
@@ -99,35 +91,144 @@ class BotAPIMethods:
                         "first_name": me.first_name or "",
                         "username": me.username or ""
                     },
-                    "chat": {
-                        "id": entity.id,
-                        "first_name": getattr(entity, 'first_name', ''),
-                        "username": getattr(entity, 'username', ''),
-                        "type": "private" if hasattr(entity, 'first_name') else "group"
-                    },
+                    "chat": chat,
                     "date": int(time.time()),
                     "text": text
                 }
             }
-            if buttons_for_response:
-                result["result"]["reply_markup"] = {"inline_keyboard": buttons_for_response}
+            if response_markup:
+                result["result"]["reply_markup"] = response_markup
+            if self.messages is not None:
+                self.messages.put(self.bot_id, chat_id if isinstance(chat_id, int) else chat['id'], result["result"])
             return result
+        except KeyboardError as e:
+            return {"ok": False, "error_code": 400, "description": f"Bad Request: {e}"}
         except Exception as e:
             logger.error(f"Ошибка sendMessage: {e}")
             return {"ok": False, "error_code": 400, "description": str(e)}
     
-    async def delete_message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+    async def send_photo(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._send_media(params, 'photo', force_document=False)
+    
+    async def send_document(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._send_media(params, 'document', force_document=True)
+    
+    async def _send_media(self, params: Dict[str, Any], field: str, force_document: bool) -> Dict[str, Any]:
+        if 'chat_id' not in params or field not in params:
+            return {"ok": False, "error_code": 400, "description": "Missing required parameters"}
+        try:
+            chat_id = int(params['chat_id'])
+        except (ValueError, TypeError):
+            chat_id = params['chat_id']
+        caption = params.get('caption') or ''
+        try:
+            me = await self.client.get_me()
+            if chat_id == me.id:
+                return {"ok": False, "error_code": 400, "description": "Bot can't send messages to itself"}
+            file = await self._input_file(params[field], field)
+            message = await self.client.send_file(
+                chat_id,
+                file,
+                caption=caption,
+                force_document=force_document,
+                silent=params.get('disable_notification', False)
+            )
+            chat = await self.chats.resolve(self.client, self.bot_id, chat_id)
+            result = {
+                "message_id": message.id,
+                "from": {
+                    "id": me.id,
+                    "is_bot": me.bot,
+                    "first_name": me.first_name or "",
+                    "username": me.username or ""
+                },
+                "chat": chat,
+                "date": int(message.date.timestamp())
+            }
+            if caption:
+                result["caption"] = caption
+            if message.photo:
+                result["photo"] = photo_to_dict(message.photo)
+            elif message.document:
+                result["document"] = document_to_dict(message.document)
+            return {"ok": True, "result": result}
+        except Exception as e:
+            logger.error(f"Ошибка отправки {field}: {e}")
+            return {"ok": False, "error_code": 400, "description": str(e)}
+    
+    async def _input_file(self, source, field: str):
+        if hasattr(source, 'stream'):
+            stream = source.stream
+            stream.seek(0, os.SEEK_END)
+            file_size = stream.tell()
+            stream.seek(0)
+            if file_size > Config.MAX_UPLOAD_SIZE:
+                raise ValueError("Bad Request: file is too big")
+            return await self.client.upload_file(
+                stream,
+                file_size=file_size,
+                file_name=source.filename or field
+            )
+        source = str(source)
+        media = resolve_file_id(source)
+        if media is not None:
+            return media
+        if source.startswith(('http://', 'https://')):
+            return source
+        raise ValueError("Bad Request: wrong remote file identifier specified")
+    
+    async def get_file(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        if 'file_id' not in params:
+            return {"ok": False, "error_code": 400, "description": "Missing required parameters"}
+        try:
+            return {"ok": True, "result": await self.files.fetch(self.client, self.bot_id, str(params['file_id']))}
+        except Exception as e:
+            logger.error(f"Ошибка getFile: {e}")
+            return {"ok": False, "error_code": 400, "description": str(e)}
+    
+    async def delete_message(self, params: Dict[str, Any], batcher=None, scheduled=None) -> Dict[str, Any]:
         if 'chat_id' not in params or 'message_id' not in params:
             return {"ok": False, "error_code": 400, "description": "Missing required parameters"}
         try:
             chat_id = int(params['chat_id'])
             message_id = int(params['message_id'])
-            await self.client.delete_messages(chat_id, [message_id])
+            execute = lambda ids: self._delete(chat_id, ids)
+            if scheduled is not None:
+                execute = scheduled(execute)
+            if batcher is not None:
+                await batcher.submit((self.bot_id, chat_id), message_id, execute)
+            else:
+                await execute([message_id])
             return {"ok": True, "result": True}
         except Exception as e:
             logger.error(f"Ошибка deleteMessage: {e}")
             return {"ok": False, "error_code": 400, "description": str(e)}
     
+    async def delete_messages(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        if 'chat_id' not in params or 'message_ids' not in params:
+            return {"ok": False, "error_code": 400, "description": "Missing required parameters"}
+        try:
+            chat_id = int(params['chat_id'])
+            message_ids = params['message_ids']
+            if isinstance(message_ids, str):
+                message_ids = json.loads(message_ids)
+            if not isinstance(message_ids, list):
+                return {"ok": False, "error_code": 400, "description": "Bad Request: message_ids must be an array"}
+            message_ids = list(dict.fromkeys(int(message_id) for message_id in message_ids))
+            if not 1 <= len(message_ids) <= 100:
+                return {"ok": False, "error_code": 400, "description": "Bad Request: message_ids must contain 1-100 elements"}
+            await self._delete(chat_id, message_ids)
+            return {"ok": True, "result": True}
+        except Exception as e:
+            logger.error(f"Ошибка deleteMessages: {e}")
+            return {"ok": False, "error_code": 400, "description": str(e)}
+    
+    async def _delete(self, chat_id: int, message_ids: List[int]) -> None:
+        await self.client.delete_messages(chat_id, message_ids)
+        if self.messages is not None:
+            for message_id in message_ids:
+                self.messages.discard(self.bot_id, chat_id, message_id)
+    
     async def edit_message_text(self, params: Dict[str, Any]) -> Dict[str, Any]:
         if 'chat_id' not in params or 'message_id' not in params or 'text' not in params:
             return {"ok": False, "error_code": 400, "description": "Missing required parameters"}
@@ -135,35 +236,40 @@ class BotAPIMethods:
             chat_id = int(params['chat_id'])
             message_id = int(params['message_id'])
             new_text = params['text']
-            messages = await self.client.get_messages(chat_id, ids=message_id)
-            if not messages:
-                return {"ok": False, "error_code": 400, "description": "Message not found"}
-            if messages.message == new_text:
-                return {"ok": False, "error_code": 400, "description": "Message is not modified"}
+            cached = self.messages.get(self.bot_id, chat_id, message_id) if self.messages is not None else None
+            if cached:
+                if cached['text_hash'] == self.messages.text_hash(new_text):
+                    return {"ok": False, "error_code": 400, "description": "Message is not modified"}
+            else:
+                messages = await self.client.get_messages(chat_id, ids=message_id)
+                if not messages:
+                    return {"ok": False, "error_code": 400, "description": "Message not found"}
+                if messages.message == new_text:
+                    return {"ok": False, "error_code": 400, "description": "Message is not modified"}
             edited_message = await self.client.edit_message(chat_id, message_id, new_text)
-            me = await self.client.get_me()
-            entity = await self.client.get_entity(chat_id)
-            return {
-                "ok": True,
-                "result": {
-                    "message_id": edited_message.id,
-                    "from": {
-                        "id": me.id,
-                        "is_bot": me.bot,
-                        "first_name": me.first_name or "",
-                        "username": me.username or ""
-                    },
-                    "chat": {
-                        "id": entity.id,
-                        "first_name": getattr(entity, 'first_name', ''),
-                        "username": getattr(entity, 'username', ''),
-                        "type": "private" if hasattr(entity, 'first_name') else "group"
-                    },
-                    "date": int(edited_message.date.timestamp()),
-                    "edit_date": int(edited_message.edit_date.timestamp()) if edited_message.edit_date else int(edited_message.date.timestamp()),
-                    "text": new_text
+            if cached:
+                from_user = cached['from']
+                chat = cached['chat']
+            else:
+                me = await self.client.get_me()
+                chat = await self.chats.resolve(self.client, self.bot_id, chat_id)
+                from_user = {
+                    "id": me.id,
+                    "is_bot": me.bot,
+                    "first_name": me.first_name or "",
+                    "username": me.username or ""
                 }
+            result = {
+                "message_id": edited_message.id,
+                "from": from_user,
+                "chat": chat,
+                "date": int(edited_message.date.timestamp()),
+                "edit_date": int(edited_message.edit_date.timestamp()) if edited_message.edit_date else int(edited_message.date.timestamp()),
+                "text": new_text
             }
+            if self.messages is not None:
+                self.messages.put(self.bot_id, chat_id, result)
+            return {"ok": True, "result": result}
         except Exception as e:
             logger.error(f"Ошибка editMessageText: {e}")
             return {"ok": False, "error_code": 400, "description": str(e)}
@@ -172,16 +278,9 @@ class BotAPIMethods:
         offset = int(params.get('offset', 0))
         limit = min(int(params.get('limit', 100)), Config.MAX_UPDATES_LIMIT)
         timeout = min(int(params.get('timeout', 0)), Config.MAX_TIMEOUT)
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            updates = self.updates.get_updates(bot_id, offset, limit)
-            if updates:
-                return {"ok": True, "result": updates}
-            if timeout > 0:
-                await asyncio.sleep(1)
-            else:
-                break
-        return {"ok": True, "result": []}
+        self.updates.acknowledge(bot_id, offset)
+        updates = await self.updates.wait_for_updates(bot_id, offset, limit, timeout)
+        return {"ok": True, "result": updates}
     
     async def answer_callback_query(self, params: Dict[str, Any], database) -> Dict[str, Any]:
         if 'callback_query_id' not in params:
@@ -0,0 +1,89 @@
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Tuple
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from logger import logger
+
+class MongoStorage(BaseStorage):
+    def __init__(self, collection, state_ttl: int = 86400, cache_ttl: float = 0, cache_size: int = 10000, key_builder: KeyBuilder = None):
+        self.collection = collection
+        self.state_ttl = state_ttl
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self.cache: OrderedDict = OrderedDict()
+    
+    async def ensure_indexes(self) -> None:
+        try:
+            await self.collection.create_index('expire_at', expireAfterSeconds=0)
+        except Exception as e:
+            logger.warning(f"Не удалось создать TTL индекс FSM: {e}")
+    
+    def _cached(self, document_id: str) -> Optional[Tuple[Optional[str], Dict[str, Any]]]:
+        entry = self.cache.get(document_id)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self.cache[document_id]
+            return None
+        self.cache.move_to_end(document_id)
+        return entry[1]
+    
+    def _remember(self, document_id: str, state: Optional[str], data: Dict[str, Any]) -> None:
+        if self.cache_ttl <= 0:
+            return
+        self.cache[document_id] = (time.monotonic() + self.cache_ttl, (state, data))
+        self.cache.move_to_end(document_id)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+    
+    async def _load(self, document_id: str) -> Tuple[Optional[str], Dict[str, Any]]:
+        cached = self._cached(document_id)
+        if cached is not None:
+            return cached
+        document = await self.collection.find_one({'_id': document_id}, {'state': 1, 'data': 1})
+        record = (document.get('state'), document.get('data') or {}) if document else (None, {})
+        self._remember(document_id, *record)
+        return record
+    
+    async def _write(self, document_id: str, field: str, value: Any) -> None:
+        cached = self._cached(document_id)
+        if cached is not None:
+            state, data = cached
+            state, data = (value, data) if field == 'state' else (state, value)
+            self._remember(document_id, state, data)
+            if not state and not data:
+                await self.collection.delete_one({'_id': document_id})
+                return
+        if value:
+            await self.collection.update_one(
+                {'_id': document_id},
+                {'$set': {field: value, 'expire_at': datetime.utcnow() + timedelta(seconds=self.state_ttl)}},
+                upsert=True
+            )
+            return
+        await self.collection.update_one({'_id': document_id}, {'$unset': {field: 1}})
+        await self.collection.delete_one({
+            '_id': document_id,
+            'state': None,
+            'data': {'$in': [None, {}]}
+        })
+    
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._write(self.key_builder.build(key), 'state', state.state if isinstance(state, State) else state)
+    
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._load(self.key_builder.build(key))
+        return state
+    
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self._write(self.key_builder.build(key), 'data', dict(data))
+    
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._load(self.key_builder.build(key))
+        return dict(data)
+    
+    async def close(self) -> None:
+        self.cache.clear()
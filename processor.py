@@ -1,50 +1,247 @@
-from typing import Dict, Any
+import time
+import json
+import functools
+import asyncio
+from typing import Dict, Any, List, Tuple, Optional, Callable
+from config import Config
 from logger import logger
 from methods import BotAPIMethods
 from events import EventHandlers
+from coalescer import EditCoalescer, DeleteBatcher
+from keyboards import KeyboardTranslator
+from media import FileCache
+from scheduler import FairScheduler
+from resolver import ChatResolver
+from tracing import tracer
 
 class RequestProcessor:
-    def __init__(self, database, client_manager, updates_manager, callback_monitor):
+    COALESCED = {'editmessagetext', 'deletemessage'}
+    
+    def __init__(self, database, client_manager, updates_manager, callback_monitor, message_cache=None, admin_api=None):
         self.db = database
         self.clients = client_manager
         self.updates = updates_manager
         self.callback_monitor = callback_monitor
+        self.messages = message_cache
+        self.admin_api = admin_api or callback_monitor.admin_api
+        self.edits = EditCoalescer()
+        self.deletes = DeleteBatcher()
+        self.keyboards = KeyboardTranslator()
+        self.files = FileCache()
+        self.chats = ChatResolver()
+        self.scheduler = FairScheduler()
+        self.last_touch: Dict[str, float] = {}
+        self.resolved_tokens: Dict[str, float] = {}
+        self.failed_tokens: Dict[str, float] = {}
+        self.preparing: Dict[str, asyncio.Task] = {}
+        self.prepare_semaphore = asyncio.Semaphore(max(1, Config.PREWARM_CONCURRENCY))
+    
+    async def prepare(self, session_name: str, token_data: Optional[Dict[str, Any]] = None) -> Tuple[Any, int]:
+        with tracer.span('telethon.get_client'):
+            client = await self.clients.get_client(session_name, functools.partial(self._attach, session_name))
+        with tracer.span('telethon.get_me'):
+            me = await client.get_me()
+        bot_id = me.id
+        if token_data is not None and not self.updates.has_allowed_updates(bot_id):
+            self.updates.set_allowed_updates(bot_id, token_data.get('allowed_updates'))
+        if bot_id not in self.callback_monitor.bot_monitors and self.updates.wants(bot_id, 'callback_query'):
+            await self.callback_monitor.start_monitoring(bot_id, self.updates)
+        return client, bot_id
+    
+    async def _attach(self, session_name: str, client) -> Callable:
+        me = await client.get_me()
+        handlers = EventHandlers(
+            client, me.id, self.updates, self.db,
+            session_name=session_name,
+            update_states=self.clients.states
+        )
+        await handlers.setup()
+        return handlers.handle_raw_message
+    
+    async def _apply_allowed_updates(self, bot_id: int, raw) -> None:
+        if isinstance(raw, str):
+            raw = json.loads(raw) if raw.strip() else []
+        if not isinstance(raw, list):
+            raise ValueError("allowed_updates must be an array of strings")
+        allowed = sorted({str(item) for item in raw})
+        current = self.updates.allowed_updates.get(bot_id)
+        if self.updates.has_allowed_updates(bot_id) and sorted(current or []) == allowed:
+            return
+        self.updates.set_allowed_updates(bot_id, allowed)
+        await self.db.update_token(bot_id, {'allowed_updates': allowed})
+        logger.info(f"allowed_updates для бота {bot_id}: {allowed or 'все'}")
+        if self.updates.wants(bot_id, 'callback_query'):
+            await self.callback_monitor.start_monitoring(bot_id, self.updates)
+        else:
+            await self.callback_monitor.stop_monitoring(bot_id)
+    
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "message_cache": self.messages.stats() if self.messages is not None else None,
+            "edit_coalescing": self.edits.stats(),
+            "delete_batching": self.deletes.stats(),
+            "keyboards": self.keyboards.stats(),
+            "chats": self.chats.stats(),
+            "scheduler": self.scheduler.stats(),
+            "callbacks": self.callback_monitor.stats(),
+            "admin_api": self.admin_api.stats()
+        }
+    
+    async def open_stream(self, token: str, offset: int = 0) -> Dict[str, Any]:
+        token_data = await self.db.get_token_data(token)
+        if not token_data:
+            return {"ok": False, "error_code": 401, "description": "Unauthorized"}
+        session_name = token_data['session_file'].replace('.session', '')
+        self._touch(session_name, token_data)
+        try:
+            _, bot_id = await self.prepare(session_name, token_data)
+        except Exception as e:
+            logger.error(f"Ошибка инициализации клиента: {e}")
+            return {"ok": False, "error_code": 401, "description": "Unauthorized"}
+        self.updates.acknowledge(bot_id, offset)
+        return {"ok": True, "result": bot_id}
+    
+    async def stream_batch(self, bot_id: int, offset: int, window: int) -> List[Dict[str, Any]]:
+        return await self.updates.wait_for_updates(
+            bot_id, offset, Config.MAX_UPDATES_LIMIT, Config.STREAM_HEARTBEAT_INTERVAL, window
+        )
+    
+    async def acknowledge(self, token: str, offset: int) -> Dict[str, Any]:
+        token_data = await self.db.get_token_data(token)
+        if not token_data:
+            return {"ok": False, "error_code": 401, "description": "Unauthorized"}
+        self.updates.acknowledge(token_data['user_id'], offset)
+        return {"ok": True, "result": True}
+    
+    async def poll_many(self, offsets: Dict[str, int], limit: int, timeout: float) -> Dict[str, Any]:
+        started = time.monotonic()
+        bots, unavailable = await self._resolve_tokens(list(offsets))
+        for token, bot_id in bots.items():
+            self.updates.acknowledge(bot_id, offsets[token])
+        tokens_by_bot = {bot_id: token for token, bot_id in bots.items()}
+        ready = await self.updates.wait_for_any(
+            {bot_id: offsets[token] for token, bot_id in bots.items()}, limit,
+            max(0.0, timeout - (time.monotonic() - started))
+        )
+        return {"ok": True, "result": {
+            "updates": {tokens_by_bot[bot_id]: updates for bot_id, updates in ready.items()},
+            "unauthorized": [token for token in offsets if token not in bots and token not in unavailable],
+            "unavailable": unavailable
+        }}
+    
+    async def _resolve_tokens(self, tokens: List[str]) -> Tuple[Dict[str, int], List[str]]:
+        found = await self.db.get_tokens_data(tokens)
+        for token in tokens:
+            if token not in found:
+                self.resolved_tokens.pop(token, None)
+                self.failed_tokens.pop(token, None)
+        now = time.monotonic()
+        resolved = {}
+        unavailable = []
+        for token, token_data in found.items():
+            failed_at = self.failed_tokens.get(token)
+            if failed_at is not None and now - failed_at < Config.OPERATOR_RESOLVE_TTL:
+                unavailable.append(token)
+                continue
+            resolved[token] = token_data['user_id']
+            expires_at = self.resolved_tokens.get(token)
+            if (expires_at is None or expires_at <= now) and token not in self.preparing:
+                task = asyncio.create_task(self._prepare_token(token, token_data))
+                self.preparing[token] = task
+                task.add_done_callback(lambda _, token=token: self.preparing.pop(token, None))
+        return resolved, unavailable
+    
+    async def _prepare_token(self, token: str, token_data: Dict[str, Any]) -> None:
+        session_name = token_data['session_file'].replace('.session', '')
+        async with self.prepare_semaphore:
+            try:
+                await self.prepare(session_name, token_data)
+            except Exception as e:
+                logger.warning(f"Не удалось подготовить клиент {session_name} для операторского опроса: {e}")
+                self.failed_tokens[token] = time.monotonic()
+                return
+        self.failed_tokens.pop(token, None)
+        self._touch(session_name, token_data)
+        self.resolved_tokens[token] = time.monotonic() + Config.OPERATOR_RESOLVE_TTL
+    
+    def _touch(self, session_name: str, token_data: Dict[str, Any]) -> None:
+        now = time.time()
+        if now - self.last_touch.get(session_name, 0) < Config.ACTIVITY_TOUCH_INTERVAL:
+            return
+        self.last_touch[session_name] = now
+        asyncio.create_task(self.db.touch_token(token_data['_id']))
     
     async def process(self, token: str, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        with tracer.trace(f"bot_api.{method}") as span:
+            result = await self._process(token, method, params)
+            span.set('ok', result.get('ok'))
+            if not result.get('ok'):
+                span.set('error_code', result.get('error_code'))
+            return result
+    
+    async def _process(self, token: str, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
         try:
             token_data = await self.db.get_token_data(token)
             if not token_data:
                 logger.warning(f"Токен не найден: {token[:10]}...")
                 return {"ok": False, "error_code": 401, "description": "Unauthorized"}
             session_name = token_data['session_file'].replace('.session', '')
+            self._touch(session_name, token_data)
             try:
-                client = await self.clients.get_client(session_name)
+                client, bot_id = await self.prepare(session_name, token_data)
             except Exception as e:
                 logger.error(f"Ошибка инициализации клиента: {e}")
                 return {"ok": False, "error_code": 401, "description": "Unauthorized"}
-            me = await client.get_me()
-            bot_id = me.id
-            if not self.updates.is_handler_registered(bot_id):
-                handlers = EventHandlers(client, bot_id, self.updates, self.db)
-                await handlers.setup()
-                await self.callback_monitor.start_monitoring(bot_id, self.updates)
-            api = BotAPIMethods(client, self.updates)
+            api = BotAPIMethods(
+                tracer.wrap_client(client), self.updates, bot_id,
+                self.messages, self.keyboards, self.files, self.admin_api, self.chats
+            )
             method_lower = method.lower()
-            if method_lower == 'getme':
-                return await api.get_me()
-            elif method_lower == 'sendmessage':
-                return await api.send_message(params)
-            elif method_lower == 'deletemessage':
-                return await api.delete_message(params)
-            elif method_lower == 'editmessagetext':
-                return await api.edit_message_text(params)
-            elif method_lower == 'getupdates':
-                return await api.get_updates(params, bot_id)
-            elif method_lower == 'answercallbackquery':
-                return await api.answer_callback_query(params, self.db)
-            else:
-                logger.warning(f"Метод не реализован: {method}")
-                return {"ok": False, "error_code": 400, "description": f"Method '{method}' not implemented"}
+            weight = token_data.get('weight', 1.0)
+            if method_lower in self.COALESCED:
+                with tracer.span('execute'):
+                    return await self._execute(api, bot_id, method, method_lower, params, weight)
+            queued_at = time.monotonic()
+            async with self.scheduler.slot(bot_id, method_lower, weight):
+                with tracer.span('execute', queued_ms=round((time.monotonic() - queued_at) * 1000, 3)):
+                    return await self._execute(api, bot_id, method, method_lower, params, weight)
         except Exception as e:
             logger.error(f"Внутренняя ошибка: {e}", exc_info=True)
-            return {"ok": False, "error_code": 500, "description": str(e)}
\ No newline at end of file
+            return {"ok": False, "error_code": 500, "description": str(e)}
+    
+    def _scheduled(self, bot_id: int, method_lower: str, weight: float, execute):
+        async def run(*args):
+            async with self.scheduler.slot(bot_id, method_lower, weight):
+                return await execute(*args)
+        return run
+    
+    async def _execute(self, api: BotAPIMethods, bot_id: int, method: str, method_lower: str, params: Dict[str, Any], weight: float = 1.0) -> Dict[str, Any]:
+        if method_lower == 'getme':
+            return await api.get_me()
+        elif method_lower == 'sendmessage':
+            return await api.send_message(params)
+        elif method_lower == 'sendphoto':
+            return await api.send_photo(params)
+        elif method_lower == 'senddocument':
+            return await api.send_document(params)
+        elif method_lower == 'getfile':
+            return await api.get_file(params)
+        elif method_lower == 'deletemessage':
+            return await api.delete_message(params, self.deletes, functools.partial(self._scheduled, bot_id, method_lower, weight))
+        elif method_lower == 'deletemessages':
+            return await api.delete_messages(params)
+        elif method_lower == 'editmessagetext':
+            key = (bot_id, str(params.get('chat_id')), str(params.get('message_id')))
+            return await self.edits.submit(key, params, self._scheduled(bot_id, method_lower, weight, api.edit_message_text))
+        elif method_lower == 'getupdates':
+            if params.get('allowed_updates') is not None:
+                try:
+                    await self._apply_allowed_updates(bot_id, params['allowed_updates'])
+                except ValueError as e:
+                    return {"ok": False, "error_code": 400, "description": f"Bad Request: {e}"}
+            return await api.get_updates(params, bot_id)
+        elif method_lower == 'answercallbackquery':
+            return await api.answer_callback_query(params, self.db)
+        else:
+            logger.warning(f"Метод не реализован: {method}")
+            return {"ok": False, "error_code": 400, "description": f"Method '{method}' not implemented"}
@@ -0,0 +1,296 @@
+import time
+import random
+import string
+import secrets
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Callable, Awaitable
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from admin_api import AdminAPIError, CircuitOpenError
+from logger import logger
+
+USERNAME_COLLATION = {'locale': 'en', 'strength': 2}
+
+def generate_token():
+    return ''.join(secrets.choice(string.ascii_letters + string.digits) for _ in range(45))
+
+def token_document(bot_id: int, owner_id: int, bot_name: str, username: str) -> Dict[str, Any]:
+    token = generate_token()
+    return {
+        'session_file': f"bot_{owner_id}_{bot_id}.session",
+        'user_id': bot_id,
+        'token': token,
+        'full_token': f"{bot_id}:{token}",
+        'owner_id': owner_id,
+        'bot_username': username,
+        'bot_username_lower': username.lower(),
+        'bot_name': bot_name,
+        'verified': False,
+        'created_at': time.time()
+    }
+
+def username_error(username: str) -> Optional[str]:
+    if not username.lower().endswith('bot'):
+        return "username must end with 'bot'"
+    if len(username) < 5:
+        return "username is too short"
+    if len(username) > 32:
+        return "username is too long"
+    if not username.replace('_', '').isalnum() or not username.isascii():
+        return "username may contain only latin letters, digits and underscores"
+    return None
+
+async def taken_usernames(tokens, users, usernames) -> set:
+    wanted = {username.lower() for username in usernames}
+    lowered = list(wanted)
+    taken = set()
+    async for doc in tokens.find({'bot_username_lower': {'$in': lowered}}, {'bot_username_lower': 1}):
+        taken.add(doc['bot_username_lower'])
+    async for doc in users.find(
+        {'$or': [{'UserName': {'$in': lowered}}, {'Usernames': {'$in': lowered}}]},
+        {'UserName': 1, 'Usernames': 1},
+        collation=USERNAME_COLLATION
+    ):
+        names = [doc.get('UserName')] + list(doc.get('Usernames') or [])
+        taken.update(name.lower() for name in names if name and name.lower() in wanted)
+    return taken
+
+class ProvisioningError(Exception):
+    pass
+
+class ProvisioningQueue:
+    MAX_ATTEMPTS = 5
+    LEASE = 120
+    IDENTITY_MAX_AGE = 600
+    POOL_CHECK_INTERVAL = 5
+    
+    def __init__(self, db, admin_api, notify: Callable[..., Awaitable[None]], concurrency: int = 4, pool_size: int = 0):
+        self.jobs = db['provisioning_jobs']
+        self.tokens = db['tokens']
+        self.pool = db['bot_identity_pool']
+        self.users = db['eventflow-userreadmodel']
+        self.admin_api = admin_api
+        self.notify = notify
+        self.concurrency = max(1, concurrency)
+        self.pool_size = pool_size
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.tasks = []
+        self.counters = {"submitted": 0, "completed": 0, "failed": 0, "retries": 0, "pool_hits": 0, "pool_misses": 0}
+    
+    async def start(self) -> None:
+        try:
+            await self.jobs.create_index('status')
+            await self.pool.create_index('expire_at', expireAfterSeconds=0)
+        except Exception as e:
+            logger.warning(f"Не удалось создать индексы провижининга: {e}")
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        if self.pool_size > 0:
+            self.tasks.append(asyncio.create_task(self._fill_pool()))
+        stale = await self.jobs.find(
+            {'status': {'$in': ['queued', 'running']}, 'lease_until': {'$lt': time.time()}},
+            {'_id': 1}
+        ).to_list(length=None)
+        for job in stale:
+            self.queue.put_nowait(job['_id'])
+        if stale:
+            logger.info(f"Возобновлено {len(stale)} незавершённых заданий создания ботов")
+    
+    async def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+    
+    async def submit(self, owner_id: int, bot_name: str, username: str, chat_id: int = None, message_id: int = None) -> Dict[str, Any]:
+        job_id = f"{owner_id}:{username.lower()}"
+        now = time.time()
+        job = {
+            '_id': job_id,
+            'owner_id': owner_id,
+            'bot_name': bot_name,
+            'username': username,
+            'chat_id': chat_id,
+            'message_id': message_id,
+            'status': 'queued',
+            'attempts': 0,
+            'lease_until': 0,
+            'created_at': now
+        }
+        try:
+            await self.jobs.insert_one(job)
+        except DuplicateKeyError:
+            existing = await self.jobs.find_one({'_id': job_id})
+            if existing and existing['status'] != 'failed':
+                logger.info(f"Задание {job_id} уже существует ({existing['status']})")
+                return existing
+            await self.jobs.replace_one({'_id': job_id}, job)
+        self.counters["submitted"] += 1
+        self.queue.put_nowait(job_id)
+        return job
+    
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self.queue.get()
+            try:
+                await self._process(job_id)
+            except Exception as e:
+                logger.error(f"Ошибка обработки задания {job_id}: {e}", exc_info=True)
+            finally:
+                self.queue.task_done()
+    
+    async def _claim(self, job_id: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        return await self.jobs.find_one_and_update(
+            {'_id': job_id, 'status': {'$in': ['queued', 'running']}, 'lease_until': {'$lt': now}},
+            {'$set': {'status': 'running', 'lease_until': now + self.LEASE}, '$inc': {'attempts': 1}},
+            return_document=ReturnDocument.AFTER
+        )
+    
+    async def _process(self, job_id: str) -> None:
+        job = await self._claim(job_id)
+        if job is None:
+            return
+        try:
+            if not job.get('phone_code_hash'):
+                await self._notify(job, 'reserve')
+                identity = await self.reserve_identity()
+                job.update(identity)
+                await self.jobs.update_one({'_id': job_id}, {'$set': identity})
+            if not job.get('token_id'):
+                token_doc = await self._reserve_username(job)
+                job['token_id'] = token_doc['_id']
+                await self.jobs.update_one({'_id': job_id}, {'$set': {'token_id': token_doc['_id']}})
+            if not job.get('user_created'):
+                await self._notify(job, 'create')
+                if not job.get('create_started'):
+                    await self.jobs.update_one({'_id': job_id}, {'$set': {'create_started': True}})
+                    await self.create_user(job, job['bot_name'], job['username'])
+                elif not await self.users.find_one({'UserId': job['bot_id']}, {'_id': 1}):
+                    logger.info(f"Повторяю create-user для {job_id}: пользователь {job['bot_id']} не найден")
+                    await self.create_user(job, job['bot_name'], job['username'])
+                job['user_created'] = True
+                await self.jobs.update_one({'_id': job_id}, {'$set': {'user_created': True}})
+            token_doc = await self.tokens.find_one_and_update(
+                {'_id': job['token_id']},
+                {'$unset': {'status': ''}},
+                return_document=ReturnDocument.AFTER
+            )
+        except (CircuitOpenError, AdminAPIError) as e:
+            retryable = isinstance(e, CircuitOpenError) or e.status >= 500
+            await self._fail(job, e.description, retryable)
+            return
+        except ProvisioningError as e:
+            await self._fail(job, str(e), False)
+            return
+        except Exception as e:
+            logger.error(f"Исключение при создании бота {job_id}: {e}", exc_info=True)
+            await self._fail(job, str(e), True)
+            return
+        await self.jobs.update_one(
+            {'_id': job_id},
+            {'$set': {'status': 'done', 'finished_at': time.time()}}
+        )
+        self.counters["completed"] += 1
+        logger.info(f"Бот успешно создан и сохранён в БД: id={job['bot_id']}, username={job['username']}, owner={job['owner_id']}")
+        await self._notify(job, 'done', token_doc)
+    
+    async def reserve_identity(self) -> Dict[str, Any]:
+        return await self._claim_identity() or await self._allocate_identity()
+    
+    async def create_user(self, identity: Dict[str, Any], bot_name: str, username: str) -> None:
+        await self.admin_api.post('create-user', json={
+            "userId": identity['bot_id'],
+            "accessHash": identity['access_hash'],
+            "phoneNumber": identity['phone'],
+            "firstName": bot_name,
+            "lastName": None,
+            "userName": username,
+            "bot": True,
+            "phoneCodeHash": identity['phone_code_hash']
+        })
+    
+    async def _reserve_username(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        document = dict(
+            token_document(job['bot_id'], job['owner_id'], job['bot_name'], job['username']),
+            status='pending'
+        )
+        try:
+            return await self.tokens.find_one_and_update(
+                {'user_id': job['bot_id']},
+                {'$setOnInsert': document},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            raise ProvisioningError('username_taken')
+    
+    async def _fail(self, job: Dict[str, Any], reason: str, retryable: bool) -> None:
+        if retryable and job['attempts'] < self.MAX_ATTEMPTS:
+            delay = min(60, 2 ** job['attempts']) * random.uniform(0.5, 1.5)
+            self.counters["retries"] += 1
+            logger.warning(f"Создание бота {job['_id']} не удалось ({reason}), повтор через {delay:.1f}с")
+            await self.jobs.update_one({'_id': job['_id']}, {'$set': {'status': 'queued', 'lease_until': 0, 'error': reason}})
+            asyncio.get_running_loop().call_later(delay, self.queue.put_nowait, job['_id'])
+            return
+        self.counters["failed"] += 1
+        logger.error(f"Создание бота {job['_id']} провалено: {reason}")
+        if job.get('token_id') and not job.get('user_created'):
+            await self.tokens.delete_one({'_id': job['token_id'], 'status': 'pending'})
+        await self.jobs.update_one(
+            {'_id': job['_id']},
+            {'$set': {'status': 'failed', 'error': reason, 'finished_at': time.time()}}
+        )
+        await self._notify(job, 'failed', reason=reason)
+    
+    async def _notify(self, job: Dict[str, Any], stage: str, token_doc: Dict[str, Any] = None, reason: str = None) -> None:
+        try:
+            await self.notify(job, stage, token_doc=token_doc, reason=reason)
+        except Exception as e:
+            logger.warning(f"Не удалось обновить статус задания {job['_id']}: {e}")
+    
+    async def _allocate_identity(self) -> Dict[str, Any]:
+        bot_id = secrets.randbelow(9000000000) + 1000000000
+        phone = str(bot_id)
+        logger.info(f"Отправляю код верификации для {bot_id}")
+        result = await self.admin_api.post('send-verification-code', params={
+            'userId': bot_id,
+            'phoneNumber': phone,
+            'code': ''.join(secrets.choice(string.digits) for _ in range(5))
+        })
+        phone_code_hash = result.get('phoneCodeHash')
+        if not phone_code_hash:
+            raise AdminAPIError(502, "phoneCodeHash не получен")
+        return {
+            'bot_id': bot_id,
+            'phone': phone,
+            'access_hash': secrets.randbelow(9223372036854775807),
+            'phone_code_hash': phone_code_hash
+        }
+    
+    async def _claim_identity(self) -> Optional[Dict[str, Any]]:
+        if self.pool_size <= 0:
+            return None
+        identity = await self.pool.find_one_and_delete(
+            {'expire_at': {'$gt': datetime.utcnow()}},
+            sort=[('expire_at', 1)]
+        )
+        if identity is None:
+            self.counters["pool_misses"] += 1
+            return None
+        self.counters["pool_hits"] += 1
+        return {key: identity[key] for key in ('bot_id', 'phone', 'access_hash', 'phone_code_hash')}
+    
+    async def _fill_pool(self) -> None:
+        while True:
+            try:
+                missing = self.pool_size - await self.pool.count_documents({'expire_at': {'$gt': datetime.utcnow()}})
+                for _ in range(max(0, missing)):
+                    identity = await self._allocate_identity()
+                    identity['expire_at'] = datetime.utcnow() + timedelta(seconds=self.IDENTITY_MAX_AGE)
+                    await self.pool.insert_one(identity)
+            except Exception as e:
+                logger.warning(f"Не удалось пополнить пул идентификаторов: {e}")
+            await asyncio.sleep(self.POOL_CHECK_INTERVAL)
+    
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.counters, queued=self.queue.qsize(), workers=self.concurrency, pool_size=self.pool_size)
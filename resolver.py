@@ -0,0 +1,96 @@
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from config import Config
+
+_MISSING = object()
+
+class ChatResolver:
+    def __init__(self, max_size: int = None, ttl: float = None, negative_ttl: float = None):
+        self.max_size = max_size or Config.CHAT_CACHE_SIZE
+        self.ttl = Config.CHAT_CACHE_TTL if ttl is None else ttl
+        self.negative_ttl = Config.CHAT_NEGATIVE_TTL if negative_ttl is None else negative_ttl
+        self.usernames: OrderedDict = OrderedDict()
+        self.chats: OrderedDict = OrderedDict()
+        self.pending: Dict[Any, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.upstream = 0
+    
+    async def resolve(self, client, bot_id: int, chat_id) -> Dict[str, Any]:
+        username = None
+        if isinstance(chat_id, str):
+            username = chat_id.lstrip('@').lower()
+            peer_id = self._get(self.usernames, (bot_id, username))
+            if peer_id is None:
+                self.negative_hits += 1
+                raise ValueError(f'No user has "{username}" as username')
+            key = (bot_id, username)
+        else:
+            peer_id = chat_id
+            key = (bot_id, chat_id)
+        if peer_id is not _MISSING:
+            chat = self._get(self.chats, (bot_id, peer_id))
+            if chat is not _MISSING:
+                self.hits += 1
+                return dict(chat)
+        self.misses += 1
+        task = self.pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(client, bot_id, chat_id, username))
+            self.pending[key] = task
+            task.add_done_callback(lambda _: self.pending.pop(key, None))
+        return dict(await asyncio.shield(task))
+    
+    async def _fetch(self, client, bot_id: int, chat_id, username: Optional[str]) -> Dict[str, Any]:
+        self.upstream += 1
+        try:
+            entity = await client.get_entity(chat_id)
+        except ValueError:
+            if username is not None:
+                self._put(self.usernames, (bot_id, username), None, self.negative_ttl)
+            raise
+        chat = {
+            "id": entity.id,
+            "first_name": getattr(entity, 'first_name', ''),
+            "username": getattr(entity, 'username', ''),
+            "type": "private" if hasattr(entity, 'first_name') else "group"
+        }
+        self._put(self.chats, (bot_id, entity.id), chat, self.ttl)
+        if isinstance(chat_id, int) and chat_id != entity.id:
+            self._put(self.chats, (bot_id, chat_id), chat, self.ttl)
+        if username is not None:
+            self._put(self.usernames, (bot_id, username), entity.id, self.ttl)
+        if chat['username'] and chat['username'].lower() != username:
+            self._put(self.usernames, (bot_id, chat['username'].lower()), entity.id, self.ttl)
+        return chat
+    
+    def _get(self, entries: OrderedDict, key):
+        entry = entries.get(key)
+        if entry is None:
+            return _MISSING
+        if entry[0] < time.monotonic():
+            del entries[key]
+            return _MISSING
+        entries.move_to_end(key)
+        return entry[1]
+    
+    def _put(self, entries: OrderedDict, key, value, ttl: float) -> None:
+        entries[key] = (time.monotonic() + ttl, value)
+        entries.move_to_end(key)
+        while len(entries) > self.max_size:
+            entries.popitem(last=False)
+    
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses + self.negative_hits
+        return {
+            "chats": len(self.chats),
+            "usernames": len(self.usernames),
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "upstream_calls": self.upstream,
+            "hit_rate": round((self.hits + self.negative_hits) / total, 4) if total else 0.0
+        }
@@ -1,17 +1,102 @@
+import os
+import hmac
 import json
 from urllib.parse import parse_qs, unquote
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, send_file, Response
 from logger import logger
 from config import Config
 from utils import normalize_params
+from tracing import tracer
 
-def create_app(async_runner, request_processor):
+def create_app(async_runner, request_processor, server_status=None, watchdog=None):
     app = Flask(__name__)
+    app.config['MAX_CONTENT_LENGTH'] = Config.MAX_UPLOAD_SIZE + 1024 * 1024
+    app.use_x_sendfile = Config.USE_X_SENDFILE
     
     @app.route('/')
     def index():
         return render_template('index.html', brand=Config.BRAND)
     
+    @app.route('/ready')
+    def ready():
+        if server_status is None:
+            return jsonify({"ok": True, "result": {"ready": True}})
+        status = server_status()
+        if not status.get('ready'):
+            return jsonify({"ok": False, "error_code": 503, "description": "Service Unavailable", "result": status}), 503
+        return jsonify({"ok": True, "result": status})
+    
+    @app.route('/stats')
+    def stats():
+        if not _operator_authorized(request):
+            return jsonify({"ok": False, "error_code": 403, "description": "Forbidden"}), 403
+        return jsonify({"ok": True, "result": async_runner.run(request_processor.stats())})
+    
+    @app.route('/debug/lag')
+    def debug_lag():
+        if not _operator_authorized(request):
+            return jsonify({"ok": False, "error_code": 403, "description": "Forbidden"}), 403
+        if watchdog is None:
+            return jsonify({"ok": False, "error_code": 404, "description": "Not Found"}), 404
+        return jsonify({"ok": True, "result": watchdog.stats()})
+    
+    @app.route('/debug/profile')
+    def debug_profile():
+        if not _operator_authorized(request):
+            return jsonify({"ok": False, "error_code": 403, "description": "Forbidden"}), 403
+        if watchdog is None:
+            return jsonify({"ok": False, "error_code": 404, "description": "Not Found"}), 404
+        try:
+            seconds = float(request.args.get('seconds', 10))
+        except ValueError:
+            return jsonify({"ok": False, "error_code": 400, "description": "Bad Request: seconds must be a number"}), 400
+        result = watchdog.profile(max(0.1, seconds))
+        if result is None:
+            return jsonify({"ok": False, "error_code": 409, "description": "Conflict: profiler is already running"}), 409
+        return Response(result, mimetype='text/plain')
+    
+    @app.route('/debug/traces')
+    def debug_traces():
+        if not _operator_authorized(request):
+            return jsonify({"ok": False, "error_code": 403, "description": "Forbidden"}), 403
+        try:
+            limit = min(int(request.args.get('limit', 50)), Config.TRACE_BUFFER_SIZE)
+            min_ms = float(request.args.get('min_ms', 0))
+        except ValueError:
+            return jsonify({"ok": False, "error_code": 400, "description": "Bad Request: invalid limit or min_ms"}), 400
+        return jsonify({"ok": True, "result": {
+            "sample_rate": tracer.sample_rate,
+            "traces": tracer.recent(limit, min_ms, request.args.get('name'))
+        }})
+    
+    @app.route('/operator/getUpdates', methods=['POST'])
+    def operator_get_updates():
+        if not _operator_authorized(request):
+            return jsonify({"ok": False, "error_code": 403, "description": "Forbidden"}), 403
+        body = request.get_json(silent=True) or {}
+        offsets = body.get('offsets')
+        if not isinstance(offsets, dict) or not offsets:
+            return jsonify({"ok": False, "error_code": 400, "description": "Bad Request: offsets must be a non-empty object"}), 400
+        if len(offsets) > Config.OPERATOR_POLL_MAX_BOTS:
+            return jsonify({"ok": False, "error_code": 400, "description": f"Bad Request: at most {Config.OPERATOR_POLL_MAX_BOTS} bots per request"}), 400
+        try:
+            offsets = {str(token): int(offset or 0) for token, offset in offsets.items()}
+            limit = min(int(body.get('limit', Config.MAX_UPDATES_LIMIT)), Config.MAX_UPDATES_LIMIT)
+            timeout = min(int(body.get('timeout', 0)), Config.MAX_TIMEOUT)
+        except (TypeError, ValueError):
+            return jsonify({"ok": False, "error_code": 400, "description": "Bad Request: offsets, limit and timeout must be numbers"}), 400
+        return jsonify(async_runner.run(request_processor.poll_many(offsets, limit, timeout)))
+    
+    @app.route('/file/bot<token>/<path:file_path>')
+    def download_file(token, file_path):
+        token_data = async_runner.run(request_processor.db.get_token_data(unquote(token)))
+        if not token_data:
+            return jsonify({"ok": False, "error_code": 401, "description": "Unauthorized"}), 401
+        path = request_processor.files.resolve(file_path, token_data['user_id'])
+        if path is None:
+            return jsonify({"ok": False, "error_code": 404, "description": "Not Found"}), 404
+        return send_file(path, conditional=True, max_age=86400, download_name=os.path.basename(path))
+    
     @app.route('/bot<path:token_and_method>', methods=['GET', 'POST'])
     def bot_api(token_and_method):
         try:
@@ -31,6 +116,10 @@ def create_app(async_runner, request_processor):
                     "description": "Method not specified"
                 }), 400
             params = _extract_params(request)
+            if method == 'stream':
+                if len(parts) > 2 and parts[2] == 'ack':
+                    return _acknowledge(async_runner, request_processor, token, params)
+                return _stream(async_runner, request_processor, token, params)
             result = async_runner.run(
                 request_processor.process(token, method, params)
             )
@@ -53,13 +142,60 @@ def create_app(async_runner, request_processor):
         }), 404
     return app
 
+def _stream(async_runner, request_processor, token: str, params: dict):
+    try:
+        last_event_id = request.headers.get('Last-Event-ID')
+        offset = int(last_event_id) + 1 if last_event_id else int(params.get('offset', 0))
+        window = min(int(params.get('window', Config.STREAM_WINDOW)), Config.STREAM_WINDOW)
+    except ValueError:
+        return jsonify({"ok": False, "error_code": 400, "description": "Bad Request: invalid offset or window"}), 400
+    result = async_runner.run(request_processor.open_stream(token, offset))
+    if not result.get('ok'):
+        return jsonify(result), result['error_code']
+    bot_id = result['result']
+    logger.info(f"Открыт поток обновлений для бота {bot_id} с offset={offset}, window={window}")
+    
+    def generate():
+        next_offset = offset
+        yield "retry: 1000\n\n"
+        while True:
+            updates = async_runner.run(request_processor.stream_batch(bot_id, next_offset, window))
+            if not updates:
+                yield ": keepalive\n\n"
+                continue
+            for update in updates:
+                yield f"id: {update['update_id']}\nevent: update\ndata: {json.dumps(update, ensure_ascii=False)}\n\n"
+            next_offset = updates[-1]['update_id'] + 1
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+def _acknowledge(async_runner, request_processor, token: str, params: dict):
+    try:
+        offset = int(params.get('offset', 0))
+    except ValueError:
+        return jsonify({"ok": False, "error_code": 400, "description": "Bad Request: offset must be a number"}), 400
+    result = async_runner.run(request_processor.acknowledge(token, offset))
+    return jsonify(result), 401 if result.get('error_code') == 401 else 200
+
+def _operator_authorized(request) -> bool:
+    if not Config.OPERATOR_KEY:
+        return False
+    key = request.headers.get('X-Operator-Key', '')
+    return hmac.compare_digest(key.encode('utf-8'), Config.OPERATOR_KEY.encode('utf-8'))
+
 def _extract_params(request) -> dict:
     params = {}
     if request.method == 'POST':
         content_type = request.headers.get('Content-Type', '')
         if 'application/json' in content_type:
             params = request.get_json() or {}
-        elif 'application/x-www-form-urlencoded' in content_type or 'multipart/form-data' in content_type:
+        elif 'multipart/form-data' in content_type:
+            params = request.form.to_dict()
+            params.update(request.files.to_dict())
+        elif 'application/x-www-form-urlencoded' in content_type:
             params = request.form.to_dict()
         elif request.data:
             try:
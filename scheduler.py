@@ -0,0 +1,127 @@
+import time
+import heapq
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from collections import defaultdict
+from typing import Dict, Any, List, Tuple
+from config import Config
+
+class TenantStats:
+    def __init__(self):
+        self.waiting = 0
+        self.served = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.waiting,
+            "served": self.served,
+            "avg_wait_ms": round(self.total_wait / self.served * 1000, 2) if self.served else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 2)
+        }
+
+class FairScheduler:
+    PRIORITIES = {
+        'answercallbackquery': 0,
+        'getme': 0,
+        'editmessagetext': 0,
+        'sendmessage': 1,
+        'deletemessage': 2,
+        'sendphoto': 2,
+        'senddocument': 2,
+        'deletemessages': 2,
+        'getfile': 2
+    }
+    DEFAULT_PRIORITY = 1
+    BYPASS = {'getupdates'}
+    
+    def __init__(self, concurrency: int = None):
+        self.concurrency = Config.SCHEDULER_CONCURRENCY if concurrency is None else concurrency
+        self.active = 0
+        self.turns: List[Tuple] = []
+        self.queues: Dict[int, List[Tuple]] = {}
+        self.virtual_time = 0.0
+        self.last_finish: Dict[int, float] = {}
+        self.sequence = itertools.count()
+        self.tenants: Dict[int, TenantStats] = defaultdict(TenantStats)
+    
+    @asynccontextmanager
+    async def slot(self, tenant: int, method: str, weight: float = 1.0):
+        if self.concurrency <= 0 or method in self.BYPASS:
+            yield
+            return
+        await self._acquire(tenant, self.PRIORITIES.get(method, self.DEFAULT_PRIORITY), weight)
+        try:
+            yield
+        finally:
+            self._release()
+    
+    async def _acquire(self, tenant: int, priority: int, weight: float) -> None:
+        stats = self.tenants[tenant]
+        if self.active < self.concurrency and not self.turns:
+            self.active += 1
+            stats.served += 1
+            return
+        start = max(self.virtual_time, self.last_finish.get(tenant, 0.0))
+        self.last_finish[tenant] = start + 1.0 / max(weight, 0.01)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.turns, (start, next(self.sequence), tenant))
+        heapq.heappush(self.queues.setdefault(tenant, []), (priority, next(self.sequence), future, time.monotonic()))
+        stats.waiting += 1
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release()
+            else:
+                future.cancel()
+                stats.waiting -= 1
+            raise
+    
+    def _release(self) -> None:
+        self.active -= 1
+        self._dispatch()
+    
+    def _dispatch(self) -> None:
+        while self.active < self.concurrency:
+            item = self._next()
+            if item is None:
+                return
+            tenant, future, enqueued_at = item
+            wait = time.monotonic() - enqueued_at
+            stats = self.tenants[tenant]
+            stats.waiting -= 1
+            stats.served += 1
+            stats.total_wait += wait
+            stats.max_wait = max(stats.max_wait, wait)
+            self.active += 1
+            future.set_result(None)
+    
+    def _next(self):
+        while self.turns:
+            start, _, tenant = heapq.heappop(self.turns)
+            queue = self.queues.get(tenant)
+            while queue:
+                _, _, future, enqueued_at = heapq.heappop(queue)
+                if not future.cancelled():
+                    if not queue:
+                        del self.queues[tenant]
+                    self.virtual_time = max(self.virtual_time, start)
+                    return tenant, future, enqueued_at
+            self.queues.pop(tenant, None)
+        return None
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "active": self.active,
+            "waiting": sum(len(queue) for queue in self.queues.values()),
+            "tenants": {
+                str(tenant): stats.to_dict()
+                for tenant, stats in self.tenants.items()
+                if stats.waiting or stats.served
+            }
+        }
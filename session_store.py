@@ -0,0 +1,361 @@
+import os
+import sys
+import glob
+import sqlite3
+import argparse
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Optional, Dict, List, Tuple
+from pymongo import MongoClient, UpdateOne
+from telethon.crypto import AuthKey
+from telethon.sessions import MemorySession
+from telethon.tl import types
+from config import Config
+from logger import logger
+
+SessionRow = Tuple[int, str, int, Optional[bytes], Optional[int]]
+EntityRow = Tuple[int, int, Optional[str], Optional[str], Optional[str]]
+
+class SessionStore(ABC):
+    _executor: Optional[ThreadPoolExecutor] = None
+    
+    @abstractmethod
+    def load_session(self, name: str) -> Optional[SessionRow]:
+        pass
+    
+    @abstractmethod
+    def save_session(self, name: str, row: SessionRow) -> None:
+        pass
+    
+    def session_exists(self, name: str) -> bool:
+        row = self.load_session(name)
+        return row is not None and row[3] is not None
+    
+    @abstractmethod
+    def delete_session(self, name: str) -> None:
+        pass
+    
+    @abstractmethod
+    def load_entities(self, name: str) -> List[EntityRow]:
+        pass
+    
+    @abstractmethod
+    def save_entities(self, name: str, rows: List[EntityRow]) -> None:
+        pass
+    
+    @abstractmethod
+    def load_update_states(self, name: str) -> List[Tuple[int, Tuple[int, int, float, int]]]:
+        pass
+    
+    @abstractmethod
+    def save_update_state(self, name: str, entity_id: int, state: Tuple[int, int, float, int]) -> None:
+        pass
+    
+    def submit(self, func, *args) -> None:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='session-store')
+        self._executor.submit(self._run, func, *args)
+    
+    @staticmethod
+    def _run(func, *args) -> None:
+        try:
+            func(*args)
+        except Exception as e:
+            logger.error(f"Ошибка записи в хранилище сессий: {e}")
+    
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+class SQLiteSessionStore(SessionStore):
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute('pragma journal_mode=wal')
+        self.conn.execute('pragma synchronous=normal')
+        self.conn.executescript("""
+            create table if not exists sessions (
+                name text primary key,
+                dc_id integer,
+                server_address text,
+                port integer,
+                auth_key blob,
+                takeout_id integer
+            );
+            create table if not exists entities (
+                session text,
+                id integer,
+                hash integer not null,
+                username text,
+                phone integer,
+                name text,
+                date integer,
+                primary key (session, id)
+            );
+            create index if not exists entities_username on entities (session, username);
+            create index if not exists entities_phone on entities (session, phone);
+            create index if not exists entities_name on entities (session, name);
+            create table if not exists update_state (
+                session text,
+                id integer,
+                pts integer,
+                qts integer,
+                date integer,
+                seq integer,
+                primary key (session, id)
+            );
+        """)
+    
+    def _execute(self, sql: str, *params):
+        with self.lock:
+            return self.conn.execute(sql, params)
+    
+    def load_session(self, name: str) -> Optional[SessionRow]:
+        return self._execute(
+            'select dc_id, server_address, port, auth_key, takeout_id from sessions where name = ?', name
+        ).fetchone()
+    
+    def save_session(self, name: str, row: SessionRow) -> None:
+        self._execute('insert or replace into sessions values (?, ?, ?, ?, ?, ?)', name, *row)
+    
+    def delete_session(self, name: str) -> None:
+        with self.lock:
+            for table, column in (('sessions', 'name'), ('entities', 'session'), ('update_state', 'session')):
+                self.conn.execute(f'delete from {table} where {column} = ?', (name,))
+    
+    def load_entities(self, name: str) -> List[EntityRow]:
+        return self._execute(
+            'select id, hash, username, phone, name from entities where session = ? order by date', name
+        ).fetchall()
+    
+    def save_entities(self, name: str, rows: List[EntityRow]) -> None:
+        now = int(datetime.now(tz=timezone.utc).timestamp())
+        with self.lock:
+            self.conn.executemany(
+                'insert or replace into entities values (?, ?, ?, ?, ?, ?, ?)',
+                [(name, *row, now) for row in rows]
+            )
+    
+    def load_update_states(self, name: str) -> List[Tuple[int, Tuple[int, int, float, int]]]:
+        rows = self._execute('select id, pts, qts, date, seq from update_state where session = ?', name).fetchall()
+        return [(row[0], row[1:]) for row in rows]
+    
+    def save_update_state(self, name: str, entity_id: int, state: Tuple[int, int, float, int]) -> None:
+        self._execute('insert or replace into update_state values (?, ?, ?, ?, ?, ?)', name, entity_id, *state)
+    
+    def close(self) -> None:
+        super().close()
+        with self.lock:
+            self.conn.close()
+
+class MongoSessionStore(SessionStore):
+    def __init__(self, uri: str):
+        self.client = MongoClient(uri)
+        db = self.client['tg']
+        self.sessions = db['telethon_sessions']
+        self.entities = db['telethon_entities']
+        self.sessions.create_index('name', unique=True)
+        self.entities.create_index([('session', 1), ('id', 1)], unique=True)
+        for field in ('username', 'phone', 'name'):
+            self.entities.create_index([('session', 1), (field, 1)])
+    
+    def load_session(self, name: str) -> Optional[SessionRow]:
+        doc = self.sessions.find_one({'name': name}, {'update_states': 0})
+        if not doc:
+            return None
+        return doc['dc_id'], doc['server_address'], doc['port'], doc.get('auth_key'), doc.get('takeout_id')
+    
+    def save_session(self, name: str, row: SessionRow) -> None:
+        dc_id, server_address, port, auth_key, takeout_id = row
+        self.sessions.update_one({'name': name}, {'$set': {
+            'dc_id': dc_id,
+            'server_address': server_address,
+            'port': port,
+            'auth_key': auth_key,
+            'takeout_id': takeout_id
+        }}, upsert=True)
+    
+    def delete_session(self, name: str) -> None:
+        self.sessions.delete_one({'name': name})
+        self.entities.delete_many({'session': name})
+    
+    def load_entities(self, name: str) -> List[EntityRow]:
+        return [
+            (doc['id'], doc['hash'], doc.get('username'), doc.get('phone'), doc.get('name'))
+            for doc in self.entities.find({'session': name}).sort('date', 1)
+        ]
+    
+    def save_entities(self, name: str, rows: List[EntityRow]) -> None:
+        now = int(datetime.now(tz=timezone.utc).timestamp())
+        self.entities.bulk_write([
+            UpdateOne({'session': name, 'id': row[0]}, {'$set': {
+                'hash': row[1],
+                'username': row[2],
+                'phone': row[3],
+                'name': row[4],
+                'date': now
+            }}, upsert=True)
+            for row in rows
+        ], ordered=False)
+    
+    def load_update_states(self, name: str) -> List[Tuple[int, Tuple[int, int, float, int]]]:
+        doc = self.sessions.find_one({'name': name}, {'update_states': 1}) or {}
+        return [
+            (int(entity_id), (s['pts'], s['qts'], s['date'], s['seq']))
+            for entity_id, s in (doc.get('update_states') or {}).items()
+        ]
+    
+    def save_update_state(self, name: str, entity_id: int, state: Tuple[int, int, float, int]) -> None:
+        pts, qts, date, seq = state
+        self.sessions.update_one({'name': name}, {'$set': {
+            f'update_states.{entity_id}': {'pts': pts, 'qts': qts, 'date': date, 'seq': seq}
+        }}, upsert=True)
+    
+    def close(self) -> None:
+        super().close()
+        self.client.close()
+
+class StoredSession(MemorySession):
+    def __init__(self, store: SessionStore, name: str):
+        super().__init__()
+        self.store = store
+        self.name = name
+        self._update_states: Dict[int, Tuple[int, int, float, int]] = dict(store.load_update_states(name))
+        self._entities = set(store.load_entities(name))
+        self._pending: Dict[int, EntityRow] = {}
+        row = store.load_session(name)
+        if row:
+            self._dc_id, self._server_address, self._port, key, self._takeout_id = row
+            self._auth_key = AuthKey(data=key) if key else None
+    
+    def _save_session(self) -> None:
+        key = self._auth_key.key if self._auth_key else None
+        self.store.submit(self.store.save_session, self.name, (self._dc_id, self._server_address, self._port, key, self._takeout_id))
+    
+    def set_dc(self, dc_id, server_address, port):
+        super().set_dc(dc_id, server_address, port)
+        self._save_session()
+    
+    @MemorySession.auth_key.setter
+    def auth_key(self, value):
+        self._auth_key = value
+        self._save_session()
+    
+    @MemorySession.takeout_id.setter
+    def takeout_id(self, value):
+        self._takeout_id = value
+        self._save_session()
+    
+    def get_update_state(self, entity_id):
+        state = self._update_states.get(entity_id)
+        return self._to_state(state) if state else None
+    
+    def set_update_state(self, entity_id, state):
+        row = (state.pts, state.qts, int(state.date.timestamp()), state.seq)
+        self._update_states[entity_id] = row
+        self.store.submit(self.store.save_update_state, self.name, entity_id, row)
+    
+    def get_update_states(self):
+        return [(entity_id, self._to_state(state)) for entity_id, state in self._update_states.items()]
+    
+    @staticmethod
+    def _to_state(state):
+        pts, qts, date, seq = state
+        return types.updates.State(pts, qts, datetime.fromtimestamp(date, tz=timezone.utc), seq, unread_count=0)
+    
+    def process_entities(self, tlo):
+        rows = self._entities_to_rows(tlo)
+        if not rows:
+            return
+        changed = [tuple(row) for row in rows if tuple(row) not in self._entities]
+        if not changed:
+            return
+        self._entities.update(changed)
+        for row in changed:
+            self._pending[row[0]] = row
+        self._flush_entities()
+    
+    def _flush_entities(self) -> None:
+        if not self._pending:
+            return
+        rows = list(self._pending.values())
+        self._pending.clear()
+        self.store.submit(self.store.save_entities, self.name, rows)
+    
+    def save(self):
+        self._flush_entities()
+    
+    def close(self):
+        self._flush_entities()
+    
+    def delete(self):
+        self._pending.clear()
+        self._entities.clear()
+        self._update_states.clear()
+        self.store.submit(self.store.delete_session, self.name)
+
+def create_session_store(backend: str) -> Optional[SessionStore]:
+    if backend == 'sqlite':
+        return SQLiteSessionStore(Config.SESSION_DB_PATH)
+    if backend == 'mongo':
+        return MongoSessionStore(Config.MONGODB_URI)
+    if backend != 'file':
+        raise ValueError(f"Неизвестный SESSION_BACKEND: {backend}")
+    return None
+
+def import_session_files(store: SessionStore, directory: str, overwrite: bool = False) -> int:
+    imported = 0
+    skip = os.path.abspath(getattr(store, 'path', ''))
+    for path in sorted(glob.glob(os.path.join(directory, '*.session'))):
+        if os.path.abspath(path) == skip:
+            continue
+        name = os.path.basename(path)[:-len('.session')]
+        if not overwrite and store.session_exists(name):
+            continue
+        try:
+            conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+            try:
+                row = conn.execute('select dc_id, server_address, port, auth_key, takeout_id from sessions').fetchone()
+                if not row:
+                    continue
+                store.save_session(name, row)
+                entities = conn.execute('select id, hash, username, phone, name from entities').fetchall()
+                if entities:
+                    store.save_entities(name, entities)
+                try:
+                    for entity_id, pts, qts, date, seq in conn.execute('select id, pts, qts, date, seq from update_state'):
+                        store.save_update_state(name, entity_id, (pts, qts, date, seq))
+                except sqlite3.OperationalError:
+                    pass
+            finally:
+                conn.close()
+            imported += 1
+        except Exception as e:
+            logger.error(f"Не удалось импортировать сессию {path}: {e}")
+    logger.info(f"Импортировано сессий: {imported}")
+    return imported
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Хранилище сессий Telethon')
+    sub = parser.add_subparsers(dest='command', required=True)
+    import_parser = sub.add_parser('import', help='импортировать файлы *.session в общее хранилище')
+    import_parser.add_argument('--backend', choices=['sqlite', 'mongo'], default=Config.SESSION_BACKEND)
+    import_parser.add_argument('--dir', default=Config.SESSIONS_DIR)
+    import_parser.add_argument('--overwrite', action='store_true')
+    args = parser.parse_args(argv)
+    store = create_session_store(args.backend)
+    if store is None:
+        logger.error("Укажите --backend sqlite или mongo")
+        return 1
+    try:
+        import_session_files(store, args.dir, overwrite=args.overwrite)
+    finally:
+        store.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+import json
+import time
+import uuid
+import random
+import asyncio
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import deque
+from typing import Dict, Any, List, Optional
+from config import Config
+from logger import logger
+
+class _NoopSpan:
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+class Span:
+    __slots__ = ('name', 'trace', 'parent', 'start', 'duration', 'attributes', 'error')
+    
+    def __init__(self, name: str, trace: 'Trace', parent: Optional['Span'], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace = trace
+        self.parent = parent
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+    
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+    
+    def finish(self) -> None:
+        self.duration = time.perf_counter() - self.start
+
+class Trace:
+    MAX_SPANS = 256
+    
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.started_at = time.time()
+        self.spans: List[Span] = []
+        self.finished = False
+    
+    def to_dict(self) -> Dict[str, Any]:
+        root = self.spans[0]
+        index = {id(span): i for i, span in enumerate(self.spans)}
+        return {
+            "trace_id": self.trace_id,
+            "name": root.name,
+            "started_at": self.started_at,
+            "duration_ms": round(root.duration * 1000, 3),
+            "attributes": root.attributes,
+            "error": root.error,
+            "spans": [
+                {
+                    "id": i,
+                    "parent": index.get(id(span.parent)) if span.parent is not None else None,
+                    "name": span.name,
+                    "offset_ms": round((span.start - root.start) * 1000, 3),
+                    "duration_ms": round(span.duration * 1000, 3) if span.duration is not None else None,
+                    "attributes": span.attributes,
+                    "error": span.error
+                }
+                for i, span in enumerate(self.spans[1:], 1)
+            ]
+        }
+
+_current: ContextVar[Optional[Span]] = ContextVar('trace_span', default=None)
+
+class Tracer:
+    def __init__(self, sample_rate: float = None, buffer_size: int = None, export_file: str = None):
+        self.sample_rate = Config.TRACE_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.traces = deque(maxlen=buffer_size or Config.TRACE_BUFFER_SIZE)
+        self.export_file = Config.TRACE_EXPORT_FILE if export_file is None else export_file
+        self.export_pending: List[str] = []
+        self.started = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+    
+    @contextmanager
+    def trace(self, name: str, **attributes):
+        if not self.enabled or _current.get() is not None or random.random() >= self.sample_rate:
+            yield NOOP_SPAN
+            return
+        trace = Trace()
+        root = Span(name, trace, None, attributes)
+        trace.spans.append(root)
+        self.started += 1
+        token = _current.set(root)
+        try:
+            yield root
+        except BaseException as e:
+            root.error = repr(e)[:200]
+            raise
+        finally:
+            _current.reset(token)
+            root.finish()
+            trace.finished = True
+            self._record(trace)
+    
+    @contextmanager
+    def span(self, name: str, **attributes):
+        parent = _current.get()
+        if parent is None or parent.trace.finished or len(parent.trace.spans) >= Trace.MAX_SPANS:
+            yield NOOP_SPAN
+            return
+        span = Span(name, parent.trace, parent, attributes)
+        parent.trace.spans.append(span)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = repr(e)[:200]
+            raise
+        finally:
+            _current.reset(token)
+            span.finish()
+    
+    def wrap_client(self, client):
+        if _current.get() is None:
+            return client
+        return TracedClient(client, self)
+    
+    def _record(self, trace: Trace) -> None:
+        data = trace.to_dict()
+        self.traces.append(data)
+        if not self.export_file:
+            return
+        self.export_pending.append(json.dumps(data, ensure_ascii=False, default=str))
+        if len(self.export_pending) == 1:
+            asyncio.get_running_loop().call_later(Config.TRACE_EXPORT_INTERVAL, self._flush_export)
+    
+    def _flush_export(self) -> None:
+        lines, self.export_pending = self.export_pending, []
+        asyncio.get_running_loop().run_in_executor(None, self._write, lines)
+    
+    def _write(self, lines: List[str]) -> None:
+        try:
+            with open(self.export_file, 'a', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+        except OSError as e:
+            logger.error(f"Не удалось записать трейсы в {self.export_file}: {e}")
+    
+    def recent(self, limit: int = 50, min_duration_ms: float = 0, name: str = None) -> List[Dict[str, Any]]:
+        result = []
+        for data in reversed(self.traces):
+            if data['duration_ms'] < min_duration_ms or (name and name.lower() not in data['name'].lower()):
+                continue
+            result.append(data)
+            if len(result) >= limit:
+                break
+        return result
+
+class TracedClient:
+    def __init__(self, client, tracer: Tracer):
+        self._client = client
+        self._tracer = tracer
+    
+    def __getattr__(self, name: str):
+        value = getattr(self._client, name)
+        if not asyncio.iscoroutinefunction(value):
+            return value
+        @functools.wraps(value)
+        async def call(*args, **kwargs):
+            with self._tracer.span(f"telethon.{name}"):
+                return await value(*args, **kwargs)
+        return call
+    
+    async def __call__(self, request, *args, **kwargs):
+        with self._tracer.span(f"telethon.{type(request).__name__}"):
+            return await self._client(request, *args, **kwargs)
+
+tracer = Tracer()
+
+def traced(name: str):
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return await func(*args, **kwargs)
+            with tracer.span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,67 @@
+import asyncio
+from typing import Dict, Optional, Set
+from config import Config
+from logger import logger
+
+class UpdateStateStore:
+    FIELDS = ('pts', 'qts', 'date', 'seq')
+    
+    def __init__(self, database):
+        self.db = database
+        self.states: Dict[str, Dict[str, int]] = {}
+        self.dirty: Set[str] = set()
+        self.flush_task: Optional[asyncio.Task] = None
+    
+    def start(self) -> None:
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self._flush_loop())
+    
+    async def load(self, session_name: str) -> Optional[Dict[str, int]]:
+        if session_name in self.states:
+            return dict(self.states[session_name])
+        doc = await self.db.get_update_state(session_name)
+        if not doc:
+            return None
+        state = {key: int(doc.get(key) or 0) for key in self.FIELDS}
+        self.states[session_name] = state
+        return dict(state)
+    
+    def record(self, session_name: str, **values) -> None:
+        state = self.states.setdefault(session_name, {key: 0 for key in self.FIELDS})
+        changed = False
+        for key, value in values.items():
+            if value is None:
+                continue
+            value = int(value)
+            if value > state.get(key, 0):
+                state[key] = value
+                changed = True
+        if changed:
+            self.dirty.add(session_name)
+    
+    async def flush(self) -> None:
+        if not self.dirty:
+            return
+        names = list(self.dirty)
+        self.dirty.clear()
+        batch = {name: dict(self.states[name]) for name in names}
+        try:
+            await self.db.save_update_states(batch)
+            logger.debug(f"Сохранено состояние обновлений для {len(batch)} сессий")
+        except Exception:
+            self.dirty.update(names)
+            raise
+    
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(Config.UPDATE_STATE_FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка сохранения состояния обновлений: {e}")
+    
+    async def close(self) -> None:
+        if self.flush_task:
+            self.flush_task.cancel()
+            self.flush_task = None
+        await self.flush()
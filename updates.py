@@ -1,6 +1,7 @@
 import time
+import asyncio
 from collections import defaultdict
-from typing import List, Dict, Set, Tuple
+from typing import List, Dict, Set, Tuple, Optional, Iterable, Callable
 from config import Config
 from logger import logger
 
@@ -11,26 +12,105 @@ class UpdatesManager:
         self.processed_messages: Dict[int, Set[Tuple]] = defaultdict(set)
         self.processed_callbacks: Dict[int, Set[Tuple]] = defaultdict(set)
         self.handlers_registered: Set[int] = set()
+        self.allowed_updates: Dict[int, Optional[Set[str]]] = {}
+        self.subscribers: Dict[int, Callable[[Dict], None]] = {}
+        self.events: Dict[int, asyncio.Event] = {}
+        self.watchers: Dict[int, Set[asyncio.Event]] = defaultdict(set)
     
     def add_update(self, bot_id: int, update: Dict) -> None:
         self.counters[bot_id] += 1
         update['update_id'] = self.counters[bot_id]
+        subscriber = self.subscribers.get(bot_id)
+        if subscriber is not None:
+            subscriber(update)
+            return
         self.queues[bot_id].append(update)
         if len(self.queues[bot_id]) > Config.MAX_QUEUE_SIZE:
             self.queues[bot_id] = self.queues[bot_id][-Config.MAX_QUEUE_SIZE:]
+        self._wake(bot_id)
         logger.debug(f"Обновление добавлено для бота {bot_id}, update_id={update['update_id']}")
     
+    def subscribe(self, bot_id: int, callback: Callable[[Dict], None]) -> List[Dict]:
+        self.subscribers[bot_id] = callback
+        return sorted(self.queues.pop(bot_id, []), key=lambda x: x['update_id'])
+    
+    def unsubscribe(self, bot_id: int) -> None:
+        self.subscribers.pop(bot_id, None)
+    
     def get_updates(self, bot_id: int, offset: int, limit: int) -> List[Dict]:
-        if offset > 0:
-            old_count = len(self.queues[bot_id])
-            self.queues[bot_id] = [u for u in self.queues[bot_id] if u['update_id'] >= offset]
-            removed = old_count - len(self.queues[bot_id])
-            if removed > 0:
-                logger.debug(f"Удалено {removed} обработанных обновлений")
+        self.acknowledge(bot_id, offset)
         available = [u for u in self.queues[bot_id] if u['update_id'] >= offset]
         result = sorted(available, key=lambda x: x['update_id'])[:limit]
         return result
     
+    def acknowledge(self, bot_id: int, offset: int) -> None:
+        if offset <= 0:
+            return
+        old_count = len(self.queues[bot_id])
+        self.queues[bot_id] = [u for u in self.queues[bot_id] if u['update_id'] >= offset]
+        removed = old_count - len(self.queues[bot_id])
+        if removed > 0:
+            logger.debug(f"Удалено {removed} обработанных обновлений")
+            self._wake(bot_id)
+    
+    async def wait_for_updates(self, bot_id: int, offset: int, limit: int, timeout: float, window: int = 0) -> List[Dict]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            event = self.events.setdefault(bot_id, asyncio.Event())
+            if window > 0:
+                unacked = sum(1 for u in self.queues[bot_id] if u['update_id'] < offset)
+                allowed = min(limit, window - unacked)
+            else:
+                allowed = limit
+            if allowed > 0:
+                available = [u for u in self.queues[bot_id] if u['update_id'] >= offset]
+                if available:
+                    return sorted(available, key=lambda x: x['update_id'])[:allowed]
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return []
+            try:
+                await asyncio.wait_for(event.wait(), remaining)
+            except asyncio.TimeoutError:
+                return []
+    
+    async def wait_for_any(self, offsets: Dict[int, int], limit: int, timeout: float) -> Dict[int, List[Dict]]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        waiter = asyncio.Event()
+        for bot_id in offsets:
+            self.watchers[bot_id].add(waiter)
+        try:
+            while True:
+                waiter.clear()
+                ready = {}
+                for bot_id, offset in offsets.items():
+                    available = [u for u in self.queues.get(bot_id, ()) if u['update_id'] >= offset]
+                    if available:
+                        ready[bot_id] = sorted(available, key=lambda x: x['update_id'])[:limit]
+                remaining = deadline - loop.time()
+                if ready or remaining <= 0:
+                    return ready
+                try:
+                    await asyncio.wait_for(waiter.wait(), remaining)
+                except asyncio.TimeoutError:
+                    return {}
+        finally:
+            for bot_id in offsets:
+                watchers = self.watchers.get(bot_id)
+                if watchers is not None:
+                    watchers.discard(waiter)
+                    if not watchers:
+                        del self.watchers[bot_id]
+    
+    def _wake(self, bot_id: int) -> None:
+        event = self.events.pop(bot_id, None)
+        if event is not None:
+            event.set()
+        for waiter in self.watchers.get(bot_id, ()):
+            waiter.set()
+    
     def is_message_processed(self, bot_id: int, msg_key: str) -> bool:
         return any(msg_key == k for k, _ in self.processed_messages[bot_id] if isinstance(k, str))
     
@@ -58,6 +138,16 @@ class UpdatesManager:
         }
         self.processed_callbacks[bot_id] = new_callbacks
     
+    def set_allowed_updates(self, bot_id: int, allowed: Optional[Iterable[str]]) -> None:
+        self.allowed_updates[bot_id] = set(allowed) if allowed else None
+    
+    def has_allowed_updates(self, bot_id: int) -> bool:
+        return bot_id in self.allowed_updates
+    
+    def wants(self, bot_id: int, update_type: str) -> bool:
+        allowed = self.allowed_updates.get(bot_id)
+        return allowed is None or update_type in allowed
+    
     def is_handler_registered(self, bot_id: int) -> bool:
         return bot_id in self.handlers_registered
     
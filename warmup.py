@@ -0,0 +1,58 @@
+import time
+import asyncio
+from typing import Dict, Any, Optional
+from logger import logger
+
+class ClientWarmup:
+    def __init__(self, database, request_processor):
+        self.db = database
+        self.processor = request_processor
+        self.state = 'disabled'
+        self.total = 0
+        self.warmed = 0
+        self.failed = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+    
+    async def run(self, limit: int, concurrency: int) -> None:
+        self.state = 'running'
+        self.started_at = time.time()
+        try:
+            tokens = await self.db.get_recent_tokens(limit)
+        except Exception as e:
+            logger.error(f"Не удалось получить список сессий для прогрева: {e}")
+            self.state = 'failed'
+            self.finished_at = time.time()
+            return
+        self.total = len(tokens)
+        logger.info(f"Прогрев {self.total} клиентов (параллельно: {concurrency})")
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def warm(token_data: Dict[str, Any]):
+            session_name = token_data['session_file'].replace('.session', '')
+            async with semaphore:
+                try:
+                    await self.processor.prepare(session_name, token_data)
+                    self.warmed += 1
+                except Exception as e:
+                    self.failed += 1
+                    logger.warning(f"Не удалось прогреть клиент {session_name}: {e}")
+
+        await asyncio.gather(*(warm(token_data) for token_data in tokens))
+        self.state = 'done'
+        self.finished_at = time.time()
+        logger.info(
+            f"Прогрев завершён за {self.finished_at - self.started_at:.1f}с: "
+            f"{self.warmed} готово, {self.failed} с ошибкой"
+        )
+    
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "total": self.total,
+            "warmed": self.warmed,
+            "failed": self.failed,
+            "pending": max(0, self.total - self.warmed - self.failed),
+            "started_at": int(self.started_at) if self.started_at else None,
+            "finished_at": int(self.finished_at) if self.finished_at else None
+        }